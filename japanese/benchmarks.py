@@ -0,0 +1,651 @@
+"""Benchmarks for the japanese package
+
+Run from this directory, optionally naming the benchmarks to run:
+    python benchmarks.py [--dict-file PATH] [--json PATH] [name ...]
+
+Without a dictionary file, a synthetic one is generated so that the
+benchmarks run offline and give comparable numbers from run to run.
+"""
+import argparse
+import dataclasses
+import datetime
+import functools
+import json
+import os
+import platform
+import random
+import tempfile
+import threading
+import timeit
+import tracemalloc
+from xml.etree import ElementTree
+
+import fuzzy
+import jisho
+import numbers
+import segment
+import synthetic
+import verbs
+import writing
+
+
+_benchmarks = {}
+
+
+def benchmark(func):
+    _benchmarks[func.__name__] = func
+    return func
+
+
+@functools.lru_cache(maxsize=None)
+def _load(dict_file):
+    return jisho.create_dictionary(dict_file)
+
+
+def _best_time(func, *args, repeat=5):
+    """Shortest time in seconds of several calls to a function"""
+    return min(timeit.repeat(lambda: func(*args), number=1, repeat=repeat))
+
+
+def _traced(func, *args):
+    """Call a function, returning the memory its result holds and the peak"""
+    tracemalloc.start()
+    try:
+        result = func(*args)
+        held, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del result
+    return held, peak
+
+
+def _synthetic_file(entries):
+    """Path of a synthetic dictionary, generated on first use"""
+    path = os.path.join(
+        tempfile.gettempdir(), 'JMdict_synthetic_{}.xml'.format(entries)
+        )
+    if not os.path.exists(path):
+        synthetic.write_synthetic(path + '.tmp', entries)
+        os.replace(path + '.tmp', path)
+    return path
+
+
+def _per_call(func, args, repeat=3):
+    """Mean microseconds per call of a function over a list of arguments"""
+    seconds = _best_time(lambda: list(map(func, args)), repeat=repeat)
+    return 10**6 * seconds / len(args)
+
+
+@benchmark
+def load_time(dict_file):
+    """Time to parse the dictionary, and to load it from a snapshot"""
+    stats = {}
+    jisho.create_dictionary(dict_file, stats=stats)
+    results = {'parse': {
+        'seconds': stats['total_seconds'],
+        'entries_per_s': stats['entries_per_second'],
+        }}
+    with tempfile.TemporaryDirectory() as directory:
+        snapshot_file = os.path.join(directory, 'JMdict_e.snapshot')
+        jisho.build_snapshot(dict_file, snapshot_file)
+        seconds = _best_time(
+            jisho.load_snapshot, snapshot_file, dict_file, repeat=3
+            )
+    results['snapshot'] = {
+        'seconds': seconds,
+        'entries_per_s': stats['entries'] / seconds,
+        }
+    return results
+
+
+@benchmark
+def dictionary_memory(dict_file):
+    """Memory held by the whole loaded dictionary, for each entry type"""
+    results = {}
+    for entry_type in (jisho.Entry, jisho.CompactEntry):
+        held, peak = _traced(
+            jisho.create_dictionary, dict_file, None, entry_type
+            )
+        results[entry_type.__name__] = {
+            'held_mb': held / 2**20,
+            'peak_mb': peak / 2**20,
+            }
+    return results
+
+
+@benchmark
+def entry_memory(dict_file):
+    """Memory held by every entry of the dictionary, for each entry type"""
+    results = {}
+    for entry_type in (jisho.Entry, jisho.CompactEntry):
+        held, peak = _traced(list, jisho.iter_entries(dict_file, entry_type))
+        results[entry_type.__name__] = {
+            'held_mb': held / 2**20,
+            'peak_mb': peak / 2**20,
+            }
+    return results
+
+
+def _parse_details(dict_file):
+    """Every entry's Details, parsed up front"""
+    context = ElementTree.iterparse(dict_file, events=('start', 'end'))
+    _, root = next(context)
+    details = {}
+    for event, node in context:
+        if event == 'end' and node.tag == 'entry':
+            details[int(node.findtext('ent_seq'))] = (
+                jisho.Details.from_node(node)
+                )
+            root.clear()
+    return details
+
+
+@benchmark
+def entry_details(dict_file):
+    """Time and memory for every entry's details, up front or on demand"""
+    eager_seconds = _best_time(_parse_details, dict_file, repeat=1)
+    eager_held, _ = _traced(_parse_details, dict_file)
+    lazy_seconds = _best_time(jisho.EntryDetails, dict_file, repeat=1)
+    lazy_held, _ = _traced(jisho.EntryDetails, dict_file)
+    dictionary = _load(dict_file)
+    details = jisho.EntryDetails(dict_file)
+    rnd = random.Random(0)
+    entries = rnd.sample(list(dictionary), min(len(dictionary), 1000))
+    return {
+        'eager': {'seconds': eager_seconds, 'held_mb': eager_held / 2**20},
+        'lazy': {
+            'seconds': lazy_seconds,
+            'held_mb': lazy_held / 2**20,
+            'us_per_lookup': _per_call(details.__getitem__, entries),
+            },
+        }
+
+
+def _parse(dict_file, workers):
+    return list(jisho.iter_entries(dict_file, workers=workers))
+
+
+@benchmark
+def parallel_parse(dict_file):
+    """Parse time with one worker up to one per CPU, in powers of two"""
+    cpus = os.cpu_count() or 1
+    counts = sorted({cpus} | {2**i for i in range(cpus.bit_length())})
+    results = {}
+    for workers in counts:
+        seconds = _best_time(_parse, dict_file, workers, repeat=1)
+        results['{} workers'.format(workers)] = {'seconds': seconds}
+    baseline = results['1 workers']['seconds']
+    for values in results.values():
+        values['speedup'] = baseline / values['seconds']
+    return results
+
+
+@benchmark
+def entry_ids(dict_file):
+    """Jisho build time and set operations, with and without ent_seq ids
+
+    Entries without a sequence number hash and compare by their contents,
+    as every entry did before ids.
+    """
+    entries = list(jisho.iter_entries(dict_file))
+    variants = {
+        'ent_seq': entries,
+        'contents': [dataclasses.replace(e, sequence=None) for e in entries],
+        }
+    results = {}
+    for name, variant in variants.items():
+        dictionary = jisho.Jisho(variant)
+        sample = random.Random(0).sample(variant, min(len(variant), 5000))
+        results[name] = {
+            'build_s': _best_time(jisho.Jisho, variant, repeat=3),
+            'contains_per_s': len(sample) / _best_time(
+                lambda: [e in dictionary for e in sample]
+                ),
+            'set_per_s': len(variant) / _best_time(set, variant),
+            }
+    return results
+
+
+def _scan_part_of_speech(dictionary, phrase):
+    """lookup_part_of_speech as a substring scan over every part of speech"""
+    matches = set()
+    for pos, ids in dictionary._by_part_of_speech.items():
+        if phrase in pos:
+            matches.update(map(dictionary._by_id.__getitem__, ids))
+    return matches
+
+
+@benchmark
+def part_of_speech_lookup(dict_file):
+    """lookup_part_of_speech for broad keywords, against a substring scan"""
+    dictionary = _load(dict_file)
+
+    def uncached(phrase):
+        dictionary._pos_by_phrase.clear()
+        dictionary._pos_matches.clear()
+        return dictionary.lookup_part_of_speech(phrase)
+
+    results = {}
+    for keyword in ('verb', 'noun', 'adjective'):
+        results[keyword] = {
+            'matches': len(dictionary.lookup_part_of_speech(keyword)),
+            'scan_ms': 1000 * _best_time(
+                _scan_part_of_speech, dictionary, keyword
+                ),
+            'first_ms': 1000 * _best_time(uncached, keyword),
+            'cached_ms': 1000 * _best_time(
+                dictionary.lookup_part_of_speech, keyword
+                ),
+            }
+    return results
+
+
+def _conjugate_each(verb_list):
+    """Call every conjugation function on every verb"""
+    conjugations = {}
+    for verb in verb_list:
+        forms = conjugations[verb] = {}
+        for form in verbs.FORMS:
+            try:
+                forms[form.__name__] = form(verb)
+            except KeyError:
+                forms[form.__name__] = None
+    return conjugations
+
+
+@benchmark
+def conjugation_batch(dict_file):
+    """conjugate_many over every verb, against each function in a loop"""
+    verb_list = [verbs.Verb.from_entry(e) for e in _load(dict_file)]
+    verb_list = [v for v in verb_list if v.type is not None]
+    results = {
+        'loop': {'seconds': _best_time(_conjugate_each, verb_list)},
+        'batch': {'seconds': _best_time(verbs.conjugate_many, verb_list)},
+        }
+    cpus = os.cpu_count() or 1
+    if cpus > 1:
+        results['batch {} workers'.format(cpus)] = {
+            'seconds': _best_time(
+                verbs.conjugate_many, verb_list, verbs.FORMS, cpus
+                ),
+            }
+    for values in results.values():
+        values['verbs_per_s'] = len(verb_list) / values['seconds']
+    return results
+
+
+@benchmark
+def lookups(dict_file):
+    """Microseconds per query for each lookup method, on sampled keys"""
+    dictionary = _load(dict_file)
+    rnd = random.Random(0)
+    entries = rnd.sample(list(dictionary), min(len(dictionary), 1000))
+    readings = [e.reading for e in entries]
+    kanji = [e.kanji for e in entries if e.kanji] or readings
+    words = [jisho.tokenize(e.meanings[0])[-1] for e in entries if e.meanings]
+    queries = {
+        'lookup_reading': readings,
+        'lookup_kanji': kanji,
+        'lookup_part_of_speech': ['verb', 'noun', 'adjective', 'godan'],
+        'lookup_prefix': [r[:1] for r in readings],
+        'lookup_wildcard': ['*' + r[-1:] for r in readings[:100]],
+        'lookup_meaning': words,
+        }
+    for method in ('reading', 'kanji', 'part_of_speech'):
+        queries['top_' + method] = queries['lookup_' + method]
+    queries['lookup_prefix_limit'] = queries['lookup_prefix']
+    results = {}
+    for method, args in queries.items():
+        if method.endswith('_limit'):
+            func = functools.partial(
+                getattr(dictionary, method[:-len('_limit')]), limit=10
+                )
+        else:
+            func = getattr(dictionary, method)
+        if method.startswith('top_'):
+            func = functools.partial(func, k=10)
+        results[method] = {
+            'us_per_query': _per_call(func, args),
+            'mean_matches': sum(len(func(a)) for a in args) / len(args),
+            }
+    return results
+
+
+def _conjugate_or_none(form):
+    def conjugate(verb):
+        try:
+            return form(verb)
+        except KeyError:
+            return None
+    return conjugate
+
+
+@benchmark
+def conjugation_forms(dict_file):
+    """Microseconds per verb for each conjugation function"""
+    verb_list = [verbs.Verb.from_entry(e) for e in _load(dict_file)]
+    verb_list = [v for v in verb_list if v.type is not None]
+    return {
+        form.__name__: {
+            'us_per_verb': _per_call(_conjugate_or_none(form), verb_list),
+            }
+        for form in verbs.FORMS
+        }
+
+
+def _romanji_corpus(words=400000):
+    """Lines of distinct words in romanji, ten to a line
+
+    Each word is one to five syllables, some ending in an n, so no word
+    is converted twice.
+    """
+    rnd = random.Random(0)
+    syllables = sorted(k for k in writing._rmj_to_hrgn if k != 'n')
+    found = set()
+    while len(found) < words:
+        word = ''.join(rnd.choices(syllables, k=rnd.randint(1, 5)))
+        if rnd.random() < 0.1:
+            word += 'n'
+        found.add(word)
+    found = sorted(found)
+    rnd.shuffle(found)
+    return '\n'.join(
+        ' '.join(found[i:i + 10]) for i in range(0, len(found), 10)
+        )
+
+
+def _romanji_to_hiragana_by_char(text):
+    """romanji_to_hiragana as it was before the regex engine"""
+    vowels = {'a', 'e', 'i', 'o', 'u'}
+    on = ''
+    hiragana = []
+    for char in text:
+        is_letter = char.isascii() and char.isalpha()
+        if is_letter:
+            on += char
+        if char in vowels or (on and not is_letter):
+            if len(on) > 1 and on[0] == on[1]:
+                if on[0] != 'n':
+                    hiragana.append('っ')
+                else:
+                    hiragana.append('ん')
+                on = on[1:]
+            hiragana.append(writing._rmj_to_hrgn[on])
+            on = ''
+        if not is_letter:
+            hiragana.append(char)
+    return ''.join(hiragana)
+
+
+@benchmark
+def romanji_throughput(dict_file):
+    """MB of romanji converted to hiragana per second, on 4 MB of words"""
+    corpus = _romanji_corpus()
+    megabytes = len(corpus.encode('utf-8')) / 2**20
+    results = {}
+    for name, func in (('by_char', _romanji_to_hiragana_by_char),
+                       ('regex', writing.romanji_to_hiragana)):
+        results[name] = {
+            'mb_per_s': megabytes / _best_time(func, corpus, repeat=3),
+            }
+    return results
+
+
+def _hiragana_to_romanji_by_char(text):
+    """hiragana_to_romanji as it was before str.translate"""
+    out = []
+    previous = ''
+    is_carried = False
+    for char in text:
+        if char in {'ゃ', 'ょ', 'ゅ'}:
+            del out[-1]
+            char = previous + char
+        if char == 'っ':
+            is_carried = True
+        else:
+            rj = writing._hrgn_to_rmj.get(char, char)
+            if is_carried:
+                rj = rj[0] + rj
+                is_carried = False
+            out.append(rj)
+        previous = char
+    return ''.join(out)
+
+
+@benchmark
+def kana_throughput(dict_file):
+    """Readings converted to romanji per second, against the old loop"""
+    readings = [e.reading for e in _load(dict_file)]
+    results = {
+        'by_char': {'seconds': _best_time(
+            lambda: list(map(_hiragana_to_romanji_by_char, readings))
+            )},
+        'translate': {'seconds': _best_time(
+            lambda: list(map(writing.hiragana_to_romanji, readings))
+            )},
+        'convert_many': {'seconds': _best_time(
+            writing.convert_many, readings
+            )},
+        }
+    for values in results.values():
+        values['readings_per_s'] = len(readings) / values['seconds']
+    return results
+
+
+def _int_to_kanji_recursive(i):
+    """int_to_kanji as it was before it worked in groups of four digits"""
+    if i in {0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 100, 1000}:
+        return numbers.number_kanji[i]
+    remainder = i
+    threshholds = [10**12, 10**8, 10**4, 1000, 100, 10]
+    out = ''
+    for n in threshholds:
+        factor, remainder = divmod(remainder, n)
+        if factor:
+            if factor == 1 and n in {10, 100, 1000}:
+                out += numbers.number_kanji[n]
+            else:
+                out += _int_to_kanji_recursive(factor) + numbers.number_kanji[n]
+        if not remainder:
+            break
+    if remainder:
+        out += numbers.number_kanji[remainder]
+    return out
+
+
+@benchmark
+def number_formatting(dict_file):
+    """Numbers converted to kanji per second, against the old recursion"""
+    rnd = random.Random(0)
+    sample = [rnd.randrange(10**rnd.randrange(1, 16)) for _ in range(100000)]
+    results = {
+        'recursive': {'seconds': _best_time(
+            lambda: list(map(_int_to_kanji_recursive, sample))
+            )},
+        'groups': {'seconds': _best_time(
+            lambda: list(map(numbers.int_to_kanji, sample))
+            )},
+        'batch': {'seconds': _best_time(numbers.ints_to_kanji, sample)},
+        }
+    for values in results.values():
+        values['numbers_per_s'] = len(sample) / values['seconds']
+    return results
+
+
+def _segment_by_probing(dictionary, lines):
+    """Longest match segmenting that looks up every piece of each line"""
+    segmented = []
+    for line in lines:
+        words = []
+        start = 0
+        while start < len(line):
+            for end in range(len(line), start, -1):
+                piece = line[start:end]
+                if (end == start + 1 or dictionary.lookup_reading(piece)
+                        or dictionary.lookup_kanji(piece)):
+                    break
+            words.append(piece)
+            start = end
+        segmented.append(words)
+    return segmented
+
+
+@benchmark
+def segment_throughput(dict_file):
+    """Characters segmented per second, against probing every piece"""
+    dictionary = _load(dict_file)
+    rnd = random.Random(0)
+    entries = rnd.sample(list(dictionary), min(len(dictionary), 20000))
+    words = [e.kanji or e.reading for e in entries]
+    lines = [''.join(words[i:i + 10]) for i in range(0, len(words), 10)]
+    characters = sum(map(len, lines))
+    segmenter = segment.Segmenter(dictionary)
+    results = {
+        'probing': {'seconds': _best_time(
+            _segment_by_probing, dictionary, lines, repeat=1
+            )},
+        'segmenter': {'seconds': _best_time(
+            lambda: list(segmenter.iter_segments(lines)), repeat=1
+            )},
+        }
+    for values in results.values():
+        values['chars_per_s'] = characters / values['seconds']
+    return results
+
+
+def _fuzzy_by_scanning(romanized, query, max_distance=2):
+    """Readings within max_distance edits of a query, comparing each one"""
+    query = fuzzy.romanize(query)
+    return sorted(
+        (distance, romanji) for distance, romanji in (
+            (fuzzy.edit_distance(query, r, max_distance), r)
+            for r in romanized
+            )
+        if distance <= max_distance
+        )
+
+
+@benchmark
+def fuzzy_lookup(dict_file):
+    """Milliseconds per romanji query with a typo, against scanning"""
+    dictionary = _load(dict_file)
+    rnd = random.Random(0)
+    queries = []
+    for entry in rnd.sample(list(dictionary), min(len(dictionary), 1000)):
+        letters = list(writing.hiragana_to_romanji(entry.reading))
+        letters[rnd.randrange(len(letters))] = rnd.choice('aiueokstnmr')
+        queries.append(''.join(letters))
+    seconds = _best_time(fuzzy.FuzzyIndex, dictionary, repeat=1)
+    index = fuzzy.FuzzyIndex(dictionary)
+    romanized = set(writing.convert_many(e.reading for e in dictionary))
+    scan = functools.partial(_fuzzy_by_scanning, romanized)
+    return {
+        'scanning': {'ms_per_query': _per_call(scan, queries[:20], 1) / 1000},
+        'fuzzy_index': {
+            'ms_per_query': _per_call(index.lookup, queries) / 1000,
+            'build_seconds': seconds,
+            'mean_matches': sum(map(len, map(index.lookup, queries)))
+            / len(queries),
+            },
+        }
+
+
+def _read_in_threads(lookup, queries, threads):
+    """Lookups per second with threads each making every query at once"""
+    start = threading.Barrier(threads + 1)
+
+    def read():
+        start.wait()
+        for query in queries:
+            lookup(query)
+
+    workers = [threading.Thread(target=read) for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+    start.wait()
+    began = timeit.default_timer()
+    for worker in workers:
+        worker.join()
+    return threads * len(queries) / (timeit.default_timer() - began)
+
+
+@benchmark
+def concurrent_reads(dict_file):
+    """Lookups per second from many threads, against a Jisho behind a lock
+
+    With the GIL, threads take turns whichever dictionary they read, so the
+    gap is the cost of the lock and of contending for it.
+    """
+    dictionary = _load(dict_file)
+    frozen = dictionary.freeze()
+    rnd = random.Random(0)
+    entries = rnd.sample(list(dictionary), min(len(dictionary), 2000))
+    queries = []
+    for e in entries:
+        queries.append(('lookup_reading', e.reading))
+        queries.append(('top_reading', e.reading, 10))
+        if e.kanji:
+            queries.append(('lookup_kanji', e.kanji))
+            queries.append(('top_kanji', e.kanji, 10))
+    lock = threading.Lock()
+
+    def locked(query):
+        with lock:
+            return getattr(dictionary, query[0])(*query[1:])
+
+    def unlocked(query):
+        return getattr(frozen, query[0])(*query[1:])
+
+    results = {}
+    for threads in (1, 4, 16):
+        for name, lookup in (('locked_jisho', locked),
+                             ('frozen_jisho', unlocked)):
+            results['{}_{}_threads'.format(name, threads)] = {
+                'lookups_per_s': max(
+                    _read_in_threads(lookup, queries, threads)
+                    for _ in range(3)
+                    ),
+                }
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        '--dict-file',
+        help='JMdict file to load, instead of a synthetic dictionary'
+        )
+    parser.add_argument(
+        '--entries', type=int, default=50000,
+        help='entries in the synthetic dictionary'
+        )
+    parser.add_argument('--json', metavar='PATH',
+                        help='also save the results to a JSON file')
+    parser.add_argument('names', nargs='*', metavar='name',
+                        help=', '.join(_benchmarks))
+    args = parser.parse_args()
+    for name in set(args.names) - set(_benchmarks):
+        parser.error('unknown benchmark {}'.format(name))
+    dict_file = args.dict_file or _synthetic_file(args.entries)
+    results = {}
+    for name in args.names or _benchmarks:
+        print(name)
+        results[name] = _benchmarks[name](dict_file)
+        for variant, values in results[name].items():
+            print('    {}: {}'.format(variant, ', '.join(
+                '{}={}'.format(k, '{:.4g}'.format(v) if isinstance(v, float)
+                               else v)
+                for k, v in values.items()
+                )))
+    if args.json:
+        run = {
+            'time': datetime.datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'cpus': os.cpu_count(),
+            'dict_file': args.dict_file,
+            'entries': None if args.dict_file else args.entries,
+            'results': results,
+            }
+        with open(args.json, 'w') as f:
+            json.dump(run, f, indent=2)
@@ -0,0 +1,232 @@
+"""Look words up by their reading in romanji, allowing for typos
+
+Every reading is romanized once, and each romanized reading is indexed
+under its trigrams: runs of three characters, with the start and end
+marked. An edit changes at most three of a word's trigrams, so a word
+within a few edits of the query shares most of its trigrams. Counting the
+shared trigrams over the index narrows the readings down to a few
+candidates, and only those are compared with the query edit by edit.
+"""
+import array
+import collections
+import itertools
+
+import jisho
+import writing
+
+
+_gram_size = 3
+
+
+def _grams(text):
+    padded = '^' * (_gram_size - 1) + text + '$' * (_gram_size - 1)
+    return {
+        padded[i:i + _gram_size] for i in range(len(padded) - _gram_size + 1)
+        }
+
+
+def _pattern(text):
+    """Bits set at the positions of each character in text"""
+    bits = {}
+    for i, char in enumerate(text):
+        bits[char] = bits.get(char, 0) | 1 << i
+    return bits
+
+
+def _distance(pattern, size, text):
+    """Levenshtein distance from the text of a _pattern to another text
+
+    This is Myers' bit-parallel algorithm, as Hyyrö gives it for the
+    distance between whole strings: a column of the usual table of
+    distances is held as bits of its steps up and down, in Python ints, so
+    it moves along a character of text in a few operations.
+    """
+    if not size:
+        return len(text)
+    mask = (1 << size) - 1
+    last = 1 << (size - 1)
+    up = mask
+    down = 0
+    score = size
+    for char in text:
+        match = pattern.get(char, 0)
+        x = match | down
+        y = (((match & up) + up) ^ up) | match
+        right_up = down | ~(y | up)
+        right_down = up & y
+        if right_up & last:
+            score += 1
+        elif right_down & last:
+            score -= 1
+        right_up = right_up << 1 | 1
+        right_down <<= 1
+        up = (right_down | ~(x | right_up)) & mask
+        down = right_up & x & mask
+    return score
+
+
+def edit_distance(a, b, limit=None):
+    """Levenshtein distance between two strings
+
+    With a limit, any distance above it is given as limit + 1.
+
+    >>> edit_distance('tabemasu', 'tabermu')
+    3
+    >>> edit_distance('tabemasu', 'nomu', limit=2)
+    3
+    """
+    if limit is not None and abs(len(a) - len(b)) > limit:
+        return limit + 1
+    distance = _distance(_pattern(a), len(a), b)
+    if limit is not None:
+        return min(distance, limit + 1)
+    return distance
+
+
+def romanize(query):
+    """The romanji a query in romanji or kana is indexed under
+
+    Romanji goes to kana and back, so that spellings of the same kana are
+    matched alike.
+
+    >>> romanize('Tabemasu'), romanize('たべます'), romanize('tabemas')
+    ('tabemasu', 'tabemasu', 'tabemas')
+    """
+    return writing.hiragana_to_romanji(
+        writing.romanji_to_hiragana(query.lower())
+        )
+
+
+class FuzzyIndex:
+    """Finds the entries of a Jisho with readings close to a query
+
+    The readings are taken from the dictionary when the FuzzyIndex is made,
+    so entries added to it later aren't seen.
+
+    >>> words = jisho.Jisho([
+    ...     jisho.Entry('たべる', ('ichidan verb',), ('to eat',), kanji='食べる'),
+    ...     jisho.Entry('たてる', ('ichidan verb',), ('to build',), kanji='建てる'),
+    ...     jisho.Entry('のむ', ('godan verb',), ('to drink',), kanji='飲む'),
+    ...     ])
+    >>> index = FuzzyIndex(words)
+    >>> [str(e) for e in index.lookup('taberu')]
+    ['食べる', '建てる']
+    >>> [str(e) for e in index.lookup('tabberu', max_distance=1)]
+    ['食べる']
+    >>> [str(e) for e in index.lookup('ノム')]
+    ['飲む']
+    """
+
+    def __init__(self, dictionary):
+        by_reading = collections.defaultdict(list)
+        for entry in dictionary:
+            by_reading[entry.reading].append(entry)
+        self._entries = collections.defaultdict(list)
+        readings = list(by_reading)
+        for reading, romanji in zip(readings, writing.convert_many(readings)):
+            self._entries[romanji].extend(by_reading[reading])
+        # Each romanized reading is known by its position in _romanji, and
+        # is indexed under its trigrams along with its length, as readings
+        # more edits longer or shorter than the query can't match it
+        self._romanji = list(self._entries)
+        self._alphabet = sorted(set(''.join(self._romanji)))
+        self._by_gram = collections.defaultdict(lambda: array.array('l'))
+        for i, romanji in enumerate(self._romanji):
+            size = len(romanji)
+            for gram in _grams(romanji):
+                self._by_gram[gram, size].append(i)
+        self._by_gram = dict(self._by_gram)
+
+    def _near(self, romanji):
+        """Readings one edit from romanji, made by every such edit"""
+        pieces = [(romanji[:i], romanji[i:]) for i in range(len(romanji) + 1)]
+        edits = {start + end[1:] for start, end in pieces if end}
+        for char in self._alphabet:
+            edits.update(start + char + end for start, end in pieces)
+            edits.update(start + char + end[1:] for start, end in pieces if end)
+        edits.discard(romanji)
+        return [(1, edit) for edit in edits if edit in self._entries]
+
+    def _within(self, romanji, max_distance):
+        """(distance, romanji) pairs of readings within max_distance edits"""
+        found = []
+        if romanji in self._entries:
+            found.append((0, romanji))
+        if max_distance == 1:
+            # Quicker than counting trigrams, for a single edit
+            found.extend(sorted(self._near(romanji)))
+        if max_distance < 2:
+            return found
+        size = len(romanji)
+        lengths = range(size - max_distance, size + max_distance + 1)
+        postings = sorted(
+            ([self._by_gram.get((gram, length), ()) for length in lengths]
+             for gram in _grams(romanji)),
+            key=lambda lists: sum(map(len, lists))
+            )
+        # Each edit removes at most _gram_size of the query's trigrams
+        shared = len(postings) - max_distance * _gram_size
+        if shared > 1:
+            # Leaving out the most common trigram counts far fewer readings,
+            # and a match still shares all but one of the others it needs
+            postings.pop()
+            shared -= 1
+        counts = collections.Counter(itertools.chain.from_iterable(
+            itertools.chain.from_iterable(postings)
+            ))
+        pattern = _pattern(romanji)
+        for i in [i for i, count in counts.items() if count >= shared]:
+            candidate = self._romanji[i]
+            distance = _distance(pattern, size, candidate)
+            if 0 < distance <= max_distance:
+                found.append((distance, candidate))
+        found.sort()
+        return found
+
+    def _max_distance(self, romanji, max_distance):
+        # Short readings are a few edits from too many others for those
+        # edits to tell them apart, so they allow fewer: none below 3
+        # letters, a single one below 8, about four kana in romanji
+        size = len(romanji)
+        if size < 8:
+            max_distance = min(max_distance, 0 if size < 3 else 1)
+        # Past that, every match must still share a trigram with the query
+        return min(max_distance, (len(_grams(romanji)) - 1) // _gram_size)
+
+    def matches(self, query, max_distance=2):
+        """Romanized readings within max_distance edits of the query
+
+        Returns (distance, romanji) pairs from the closest. Queries under
+        3 letters match exactly, and under 8 allow a single edit.
+        """
+        romanji = romanize(query)
+        return self._within(
+            romanji, self._max_distance(romanji, max_distance)
+            )
+
+    def lookup(self, query, limit=10, max_distance=2):
+        """Entries with readings close to a query in romanji or kana
+
+        The entries are ordered by the edits their readings are from the
+        query, then from most to least common, and at most limit of them
+        are returned. Readings further from the query are only looked for
+        while there are fewer than limit entries closer to it.
+        """
+        romanji = romanize(query)
+        max_distance = self._max_distance(romanji, max_distance)
+        for distance in range(max_distance + 1):
+            matches = self._within(romanji, distance)
+            found = [
+                (d, entry)
+                for d, match in matches
+                for entry in self._entries[match]
+                ]
+            if limit is not None and len(found) >= limit:
+                break
+        found.sort(key=_match_rank)
+        return [entry for _, entry in found[:limit]]
+
+
+def _match_rank(match):
+    distance, entry = match
+    return distance, entry.prevalence.rank, entry.reading, entry.kanji
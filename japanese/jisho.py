@@ -6,25 +6,59 @@ Downloaded from:
 Papers relating to project:
     http://www.edrdg.org/~jwb/papers.html
 """
+import array
+import bisect
 import collections
+import contextlib
+import contextvars
+import gc
+import heapq
+import itertools
+import mmap
+import multiprocessing
+import operator
 import os
+import pickle
 import re
-from dataclasses import dataclass
+import sys
+import threading
+import time
+import tracemalloc
+from dataclasses import dataclass, field
 from xml.etree import ElementTree
 
 
 _code_values = dict()
+_code_pattern = re.compile(r'&#(\d+);')
+_word_pattern = re.compile(r'\w+')
 _dict_file = os.path.join(os.path.dirname(__file__), 'JMdict_e.xml')
+_snapshot_file = os.path.join(os.path.dirname(__file__), 'JMdict_e.snapshot')
+_snapshot_version = 6
+_lang_attr = '{http://www.w3.org/XML/1998/namespace}lang'
+
+
+def tokenize(text):
+    """Lowercase words of an English meaning or query"""
+    return _word_pattern.findall(text.lower())
+
+
+def _code_value(match):
+    code = match.group()
+    value = _code_values.get(code)
+    if value is None:
+        value = _code_values[code] = chr(int(match.group(1)))
+    return value
 
 
 def decode_chars(text):
-    codes = set(re.findall(r'&#\d+;', text))
-    new_codes = codes - set(_code_values.keys())
-    for nc in new_codes:
-        _code_values[nc] = chr(int(nc[2:-1]))
-    for cd in codes:
-        text = text.replace(cd, _code_values[cd])
-    return text
+    """Replace the numeric character references in text
+
+    >>> decode_chars('to see &#38;#8230;')
+    'to see &#8230;'
+    """
+    if '&' not in text:
+        return text
+    return _code_pattern.sub(_code_value, text)
 
 
 @dataclass
@@ -54,6 +88,24 @@ class Prevalence:
                 out.top_n = 500 * int(nv[2:])
         return out
 
+    @property
+    def rank(self):
+        """Approximate frequency rank, lower for more common words
+
+        The nf bands place a word within the 24,000 most common ones, while
+        the news, ichimango, loanword and special lists only tell whether it
+        is in their first or second tier.
+        """
+        if self.top_n is not None:
+            return self.top_n
+        tiers = [
+            t for t in (self.news, self.ichimango, self.loanword, self.special)
+            if t is not None
+            ]
+        if tiers:
+            return 25000 * min(tiers)
+        return 100000
+
 
 @dataclass
 class Entry:
@@ -62,7 +114,11 @@ class Entry:
     meanings: tuple
     kanji: str = ''
     kanji_alternates: tuple = tuple()
-    prevalence: Prevalence = Prevalence()
+    prevalence: Prevalence = field(default_factory=Prevalence)
+    # JMdict's ent_seq, which stays the same from one release to the next
+    sequence: int = None
+
+    _prevalence_type = Prevalence
 
     @classmethod
     def from_node(cls, node):
@@ -70,19 +126,19 @@ class Entry:
         reading = decode_chars(read_node.find('reb').text)
         sense_node = node.find('sense')
         parts_of_speech = tuple(
-            decode_chars(n.text).lower().replace('`', '\'')
-            for n in sense_node.findall('pos')
+            _part_of_speech(n.text) for n in sense_node.findall('pos')
             )
         gloss_nodes = sense_node.findall('gloss')
-        lang_attr = '{http://www.w3.org/XML/1998/namespace}lang'
         meanings = tuple(
             decode_chars(n.text) for n in gloss_nodes
-            if n.attrib[lang_attr].startswith('en')
+            if n.attrib[_lang_attr].startswith('en')
             )
+        sequence = node.findtext('ent_seq')
         entry = cls(
             reading=reading,
             parts_of_speech=parts_of_speech,
-            meanings=meanings
+            meanings=meanings,
+            sequence=int(sequence) if sequence else None
             )
         kanji_nodes = node.findall('k_ele')
         if kanji_nodes:
@@ -91,14 +147,29 @@ class Entry:
                 decode_chars(n.find('keb').text) for n in kanji_nodes[1:]
                 )
             prev_nodes = kanji_nodes[0].findall('ke_pri')
-            entry.prevalence = Prevalence.from_nodes(prev_nodes)
+            entry.prevalence = cls._prevalence_type.from_nodes(prev_nodes)
         else:
             prev_nodes = read_node.findall('reb/re_pri')
-            entry.prevalence = Prevalence.from_nodes(prev_nodes)
+            entry.prevalence = cls._prevalence_type.from_nodes(prev_nodes)
         return entry
 
     def __hash__(self):
-        return hash(self.reading + ''.join(m for m in self.meanings))
+        if self.sequence is not None:
+            return hash(self.sequence)
+        return hash(self.reading + ''.join(self.meanings))
+
+    def __eq__(self, other):
+        """Entries with sequence numbers are equal if the numbers are
+
+        Other entries are compared field by field.
+        """
+        if other.__class__ is not self.__class__:
+            return NotImplemented
+        if self.sequence != other.sequence:
+            return False
+        if self.sequence is not None:
+            return True
+        return _contents(self) == _contents(other)
 
     def __str__(self):
         if self.kanji:
@@ -114,13 +185,177 @@ class Entry:
         return False
 
 
+# The fields of a Prevalence or CompactPrevalence, quicker than astuple
+_prevalence_values = operator.attrgetter(
+    'news', 'ichimango', 'loanword', 'special', 'top_n'
+    )
+
+
+def _contents(entry):
+    """Everything an entry says about its word, apart from its sequence"""
+    return (
+        entry.reading, entry.parts_of_speech, entry.meanings, entry.kanji,
+        entry.kanji_alternates, _prevalence_values(entry.prevalence)
+        )
+
+
+@dataclass(slots=True)
+class CompactPrevalence:
+    """Prevalence without a per-instance __dict__"""
+    news: int = None
+    ichimango: int = None
+    loanword: int = None
+    special: int = None
+    top_n: int = None
+
+    from_nodes = classmethod(Prevalence.from_nodes.__func__)
+    rank = Prevalence.rank
+
+
+@dataclass(slots=True)
+class CompactEntry:
+    """Entry without a per-instance __dict__, for holding all of JMdict"""
+    reading: str
+    parts_of_speech: tuple
+    meanings: tuple
+    kanji: str = ''
+    kanji_alternates: tuple = tuple()
+    prevalence: CompactPrevalence = field(default_factory=CompactPrevalence)
+    sequence: int = None
+
+    _prevalence_type = CompactPrevalence
+
+    from_node = classmethod(Entry.from_node.__func__)
+    __hash__ = Entry.__hash__
+    __eq__ = Entry.__eq__
+    __str__ = Entry.__str__
+    is_part_of_speech = Entry.is_part_of_speech
+
+
+def _part_of_speech(text):
+    # The same few hundred parts of speech repeat across every entry
+    return sys.intern(decode_chars(text).lower().replace('`', '\''))
+
+
+def _texts(node, tag):
+    return tuple(decode_chars(n.text) for n in node.findall(tag))
+
+
+@dataclass
+class Kanji:
+    """A way of writing an entry's word in kanji"""
+    text: str
+    prevalence: Prevalence = field(default_factory=Prevalence)
+    # Notes on the spelling, such as that its kanji are out of date
+    info: tuple = tuple()
+
+
+@dataclass
+class Reading:
+    """A reading of an entry's word"""
+    text: str
+    prevalence: Prevalence = field(default_factory=Prevalence)
+    # The kanji it reads, or () for all of them
+    kanji: tuple = tuple()
+    # Whether it isn't a true reading of the kanji, as for some loanwords
+    no_kanji: bool = False
+    info: tuple = tuple()
+
+
+@dataclass
+class Sense:
+    """One of the meanings of an entry's word"""
+    parts_of_speech: tuple
+    meanings: tuple
+    # The kanji and readings it is restricted to, or () for all of them
+    kanji: tuple = tuple()
+    readings: tuple = tuple()
+    # Words to see as well, and words of opposite meaning, as JMdict gives
+    # them: a kanji or reading, or both split by a dot, and maybe a sense
+    cross_references: tuple = tuple()
+    antonyms: tuple = tuple()
+    fields: tuple = tuple()
+    misc: tuple = tuple()
+    dialects: tuple = tuple()
+    notes: tuple = tuple()
+
+
+@dataclass
+class Details:
+    """Every kanji, reading and sense of an entry, which Entry leaves out"""
+    kanji: tuple
+    readings: tuple
+    senses: tuple
+
+    @classmethod
+    def from_node(cls, node):
+        kanji = tuple(
+            Kanji(decode_chars(n.findtext('keb')),
+                  Prevalence.from_nodes(n.findall('ke_pri')),
+                  _texts(n, 'ke_inf'))
+            for n in node.findall('k_ele')
+            )
+        readings = tuple(
+            Reading(decode_chars(n.findtext('reb')),
+                    Prevalence.from_nodes(n.findall('re_pri')),
+                    _texts(n, 're_restr'),
+                    n.find('re_nokanji') is not None,
+                    _texts(n, 're_inf'))
+            for n in node.findall('r_ele')
+            )
+        senses = []
+        parts_of_speech = ()
+        for n in node.findall('sense'):
+            # A sense without parts of speech has those of the one before
+            parts_of_speech = tuple(
+                _part_of_speech(pos.text) for pos in n.findall('pos')
+                ) or parts_of_speech
+            senses.append(Sense(
+                parts_of_speech,
+                tuple(
+                    decode_chars(gloss.text) for gloss in n.findall('gloss')
+                    if gloss.get(_lang_attr, 'eng').startswith('en')
+                    ),
+                _texts(n, 'stagk'), _texts(n, 'stagr'), _texts(n, 'xref'),
+                _texts(n, 'ant'), _texts(n, 'field'), _texts(n, 'misc'),
+                _texts(n, 'dial'), _texts(n, 's_inf'),
+                ))
+        return cls(kanji, readings, tuple(senses))
+
+
+def _id_array(ids=()):
+    return array.array('q', ids)
+
+
 class Jisho(collections.abc.MutableSet):
     def __init__(self, entries):
-        self._entries = set()
-        self._by_kanji = collections.defaultdict(set)
-        self._by_reading = collections.defaultdict(set)
-        self._by_part_of_speech = collections.defaultdict(set)
+        # Each entry has an id, which is its sequence number if it has one
+        # or else a negative number, and the indexes hold arrays of ids
+        self._entries = {}
+        self._by_id = {}
+        self._next_id = -1
+        self._by_kanji = collections.defaultdict(_id_array)
+        self._by_reading = collections.defaultdict(_id_array)
+        self._by_part_of_speech = collections.defaultdict(_id_array)
+        self._by_kanji_alternate = collections.defaultdict(_id_array)
+        self._by_word = collections.defaultdict(_id_array)
         self.parts_of_speech = set()
+        self._pos_by_word = collections.defaultdict(set)
+        self._pos_by_phrase = {}
+        self._pos_matches = {}
+        self._sorted_text = None
+        self._prefix_tops = {}
+        # Each id's sort key from most to least common, and the ids under
+        # some index keys in that order, kept sorted once they exist
+        self._ranks = {}
+        self._ranked_lists = {
+            'reading': {}, 'kanji': {}, 'part_of_speech': {},
+            }
+        # Values worked out ahead of time for entries, by name, which are
+        # saved along with the dictionary in snapshots
+        self.precomputed = {}
+        # The EntryDetails to read entries' full details from, if any
+        self.details = None
         for e in entries:
             self.add(e)
 
@@ -134,41 +369,1174 @@ class Jisho(collections.abc.MutableSet):
         return len(self._entries)
 
     def add(self, x):
-        self._entries.add(x)
-        self._by_reading[x.reading].add(x)
+        if x in self._entries:
+            return
+        i = x.sequence
+        if i is None:
+            i = self._next_id
+            self._next_id -= 1
+        self._entries[x] = i
+        self._by_id[i] = x
+        self._ranks[i] = _rank_key(x, i)
+        self._insert_ranked('reading', x.reading, i)
+        self._insert_ranked('kanji', x.kanji, i)
+        for pos in x.parts_of_speech:
+            self._insert_ranked('part_of_speech', pos, i)
+        self._by_reading[x.reading].append(i)
         for pos in x.parts_of_speech:
-            self._by_part_of_speech[pos].add(x)
-            self.parts_of_speech.add(pos)
+            self._by_part_of_speech[pos].append(i)
+            if pos not in self.parts_of_speech:
+                self._add_part_of_speech(pos)
+        if x.parts_of_speech:
+            self._pos_matches.clear()
         if x.kanji:
-            self._by_kanji[x.kanji].add(x)
+            self._by_kanji[x.kanji].append(i)
+        for alt in x.kanji_alternates:
+            self._by_kanji_alternate[alt].append(i)
+        for word in {w for m in x.meanings for w in tokenize(m)}:
+            self._by_word[word].append(i)
+        self._sorted_text = None
+        self._prefix_tops.clear()
 
     def discard(self, x):
-        self._by_reading[x.reading].discard(x)
+        i = self._entries.pop(x, None)
+        if i is None:
+            return
+        # The entry held may be an older version of x with the same number
+        x = self._by_id.pop(i)
+        del self._ranks[i]
+        # Removing from a sorted list is rare enough to just rebuild it
+        self._ranked_lists['reading'].pop(x.reading, None)
+        self._ranked_lists['kanji'].pop(x.kanji, None)
         for pos in x.parts_of_speech:
-            self._by_part_of_speech[pos].discard(x)
+            self._ranked_lists['part_of_speech'].pop(pos, None)
+        _remove_id(self._by_reading, x.reading, i)
+        for pos in x.parts_of_speech:
+            _remove_id(self._by_part_of_speech, pos, i)
+        if x.parts_of_speech:
+            self._pos_matches.clear()
         if x.kanji:
-            self._by_kanji[x.kanji].discard(x)
+            _remove_id(self._by_kanji, x.kanji, i)
+        for alt in x.kanji_alternates:
+            _remove_id(self._by_kanji_alternate, alt, i)
+        for word in {w for m in x.meanings for w in tokenize(m)}:
+            _remove_id(self._by_word, word, i)
+        for values in self.precomputed.values():
+            values.pop(x, None)
+        self._sorted_text = None
+        self._prefix_tops.clear()
+
+    def copy(self):
+        """A Jisho with the same entries, which can change independently
+
+        The indexes are copied as they are, which is much quicker than
+        adding every entry to a new Jisho.
+        """
+        other = Jisho(())
+        other._entries = dict(self._entries)
+        other._by_id = dict(self._by_id)
+        other._next_id = self._next_id
+        for name in ('_by_reading', '_by_kanji', '_by_part_of_speech',
+                     '_by_kanji_alternate', '_by_word'):
+            getattr(other, name).update(
+                (key, _id_array(ids)) for key, ids in getattr(self, name).items()
+                )
+        for pos in self.parts_of_speech:
+            other._add_part_of_speech(pos)
+        other._ranks = dict(self._ranks)
+        other.precomputed = {
+            name: dict(values) for name, values in self.precomputed.items()
+            }
+        other.details = self.details
+        return other
+
+    def freeze(self):
+        """A FrozenJisho with the same entries, to share between threads"""
+        return FrozenJisho(self)
+
+    def _entries_of(self, ids):
+        return set(map(self._by_id.__getitem__, ids))
+
+    def _insert_ranked(self, name, key, i):
+        ranked = self._ranked_lists[name].get(key)
+        if ranked is not None:
+            bisect.insort(ranked, i, key=self._ranks.__getitem__)
+
+    def _ranked_list(self, name, key):
+        """Ids under key in an index, from most to least common entry"""
+        ranked = self._ranked_lists[name].get(key)
+        if ranked is None:
+            ids = getattr(self, '_by_' + name).get(key)
+            if not ids:
+                return []
+            ranked = sorted(ids, key=self._ranks.__getitem__)
+            self._ranked_lists[name][key] = ranked
+        return ranked
+
+    def _ranked(self, ids, limit):
+        """Entries from most to least common, keeping the first limit"""
+        if limit is None:
+            ids = sorted(ids, key=self._ranks.__getitem__)
+        else:
+            ids = heapq.nsmallest(limit, ids, key=self._ranks.__getitem__)
+        return list(map(self._by_id.__getitem__, ids))
+
+    def _add_part_of_speech(self, pos):
+        self.parts_of_speech.add(pos)
+        for word in tokenize(pos):
+            self._pos_by_word[word].add(pos)
+        self._pos_by_phrase.clear()
+
+    def _parts_of_speech_containing(self, phrase):
+        """Parts of speech with phrase in them, remembered per phrase
+
+        Only phrases found in some part of speech are remembered, so the
+        cache is bounded by the substrings of the tags rather than growing
+        with every phrase asked for.
+        """
+        tags = self._pos_by_phrase.get(phrase)
+        if tags is None:
+            words = tokenize(phrase)
+            if words:
+                # Only tags with a word containing the longest one can match
+                longest = max(words, key=len)
+                candidates = set()
+                for word, word_tags in self._pos_by_word.items():
+                    if longest in word:
+                        candidates.update(word_tags)
+            else:
+                candidates = self.parts_of_speech
+            tags = [pos for pos in candidates if phrase in pos]
+            if tags:
+                self._pos_by_phrase[phrase] = tags
+        return tags
 
     def lookup_part_of_speech(self, phrase: str):
+        """Entries with a part of speech containing phrase
+
+        The result is a read-only set, shared between calls until the Jisho
+        next changes. Phrases that match no part of speech are not kept.
+
+        >>> words = Jisho([Entry('たべる', ('ichidan verb',), ())])
+        >>> len(words.lookup_part_of_speech('verb'))
+        1
+        >>> len(words.lookup_part_of_speech('no such tag'))
+        0
+        >>> sorted(words._pos_matches)
+        ['verb']
+        """
         phrase = phrase.lower()
-        matches = set()
-        for pos, entries in self._by_part_of_speech.items():
-            if phrase in pos:
-                matches.update(entries)
+        matches = self._pos_matches.get(phrase)
+        if matches is None:
+            tags = self._parts_of_speech_containing(phrase)
+            matches = frozenset(map(
+                self._by_id.__getitem__,
+                itertools.chain.from_iterable(
+                    self._by_part_of_speech.get(pos, ()) for pos in tags
+                    )
+                ))
+            if tags:
+                self._pos_matches[phrase] = matches
         return matches
 
+    def top_part_of_speech(self, phrase: str, k: int):
+        """The k most common entries with a part of speech containing phrase
+
+        Only as many entries as are returned are read from each part of
+        speech's entries, which are kept sorted from most to least common.
+
+        >>> words = Jisho([
+        ...     Entry('たべる', ('ichidan verb',), (), prevalence=Prevalence(1)),
+        ...     Entry('みる', ('ichidan verb',), (), prevalence=Prevalence(2)),
+        ...     Entry('のむ', ('godan verb',), ()),
+        ...     ])
+        >>> [str(e) for e in words.top_part_of_speech('verb', 2)]
+        ['たべる', 'みる']
+        """
+        tags = self._parts_of_speech_containing(phrase.lower())
+        merged = heapq.merge(
+            *(self._ranked_list('part_of_speech', pos) for pos in tags),
+            key=self._ranks.__getitem__
+            )
+        top = []
+        seen = set()
+        for i in merged:
+            if len(top) == k:
+                break
+            # An entry may have more than one of the matching tags
+            if i not in seen:
+                seen.add(i)
+                top.append(self._by_id[i])
+        return top
+
     def lookup_reading(self, reading: str):
         reading = reading.lower()
-        return self._by_reading.get(reading, set())
+        return self._entries_of(self._by_reading.get(reading, ()))
+
+    def top_reading(self, reading: str, k: int):
+        """The k most common entries with a reading"""
+        ranked = self._ranked_list('reading', reading.lower())
+        return list(map(self._by_id.__getitem__, ranked[:k]))
 
     def lookup_kanji(self, kanji: str):
         kanji = kanji.lower()
-        return self._by_kanji.get(kanji, set())
+        return self._entries_of(self._by_kanji.get(kanji, ()))
+
+    def top_kanji(self, kanji: str, k: int):
+        """The k most common entries written with kanji"""
+        ranked = self._ranked_list('kanji', kanji.lower())
+        return list(map(self._by_id.__getitem__, ranked[:k]))
+
+    def _text_indexes(self):
+        return self._by_reading, self._by_kanji, self._by_kanji_alternate
+
+    def _text_keys(self):
+        """Sorted readings and kanji, and the same each spelt backwards
+
+        Both are rebuilt after the Jisho changes, and set together so that
+        a reader in another thread never sees one without the other.
+        """
+        sorted_text = self._sorted_text
+        if sorted_text is None:
+            keys = set()
+            for index in self._text_indexes():
+                keys.update(k for k, v in index.items() if v)
+            sorted_text = sorted(keys), sorted(k[::-1] for k in keys)
+            self._sorted_text = sorted_text
+        return sorted_text
+
+    def _ranked_matches(self, keys, limit):
+        ids = set()
+        for key in keys:
+            for index in self._text_indexes():
+                ids.update(index.get(key, ()))
+        return self._ranked(ids, limit)
+
+    def lookup_prefix(self, text: str, limit: int = None):
+        """Entries with a reading or kanji starting with text
+
+        The entries are ordered from most to least common, and at most limit
+        of them are returned.
+
+        >>> words = Jisho([
+        ...     Entry('たべる', ('ichidan verb',), (), kanji='食べる'),
+        ...     Entry('たべもの', ('noun',), (), kanji='食べ物',
+        ...           prevalence=Prevalence(1)),
+        ...     Entry('のむ', ('godan verb',), (), kanji='飲む'),
+        ...     ])
+        >>> [str(e) for e in words.lookup_prefix('たべ')]
+        ['食べ物', '食べる']
+        >>> [str(e) for e in words.lookup_prefix('食', limit=1)]
+        ['食べ物']
+
+        The most common entries of prefixes with many matches are kept.
+
+        >>> words = Jisho(
+        ...     Entry('か{:03}'.format(i), ('noun',), (),
+        ...           prevalence=Prevalence(i))
+        ...     for i in range(_prefix_top_size + 10)
+        ...     )
+        >>> [str(e) for e in words.lookup_prefix('か', limit=3)]
+        ['か000', 'か001', 'か002']
+        >>> len(words._prefix_tops['か'])
+        100
+        >>> [str(e) for e in words.lookup_prefix('か', limit=2)]
+        ['か000', 'か001']
+        """
+        keys, _ = self._text_keys()
+        prefix = text.lower()
+        if limit is None or limit > _prefix_top_size:
+            return self._ranked_matches(_prefixed(keys, prefix), limit)
+        # Ranking every match of a short prefix takes far longer than the
+        # few entries asked for, so the most common are kept per prefix
+        top = self._prefix_tops.get(prefix)
+        if top is None:
+            matches = _prefixed(keys, prefix)
+            if len(matches) <= _prefix_top_size:
+                return self._ranked_matches(matches, limit)
+            top = self._ranked_matches(matches, _prefix_top_size)
+            self._prefix_tops[prefix] = top
+        return top[:limit]
+
+    def lookup_wildcard(self, pattern: str, limit: int = None):
+        """Entries with a reading or kanji matching a pattern
+
+        A * in the pattern matches any run of characters. The entries are
+        ordered from most to least common, and at most limit of them are
+        returned.
+
+        >>> words = Jisho([
+        ...     Entry('たべる', ('ichidan verb',), (), kanji='食べる'),
+        ...     Entry('たべもの', ('noun',), (), kanji='食べ物',
+        ...           prevalence=Prevalence(1)),
+        ...     Entry('しらべる', ('ichidan verb',), (), kanji='調べる'),
+        ...     ])
+        >>> [str(e) for e in words.lookup_wildcard('*べる')]
+        ['調べる', '食べる']
+        >>> [str(e) for e in words.lookup_wildcard('た*')]
+        ['食べ物', '食べる']
+        >>> [str(e) for e in words.lookup_wildcard('*べ*', limit=2)]
+        ['食べ物', '調べる']
+        >>> len(words.lookup_wildcard('*'))
+        3
+        >>> [str(e) for e in words.lookup_wildcard('たべる')]
+        ['食べる']
+        """
+        parts = pattern.lower().split('*')
+        if len(parts) == 1:
+            return self._ranked_matches(parts, limit)
+        keys, reversed_keys = self._text_keys()
+        if parts[0]:
+            candidates = _prefixed(keys, parts[0])
+        elif parts[-1]:
+            candidates = (
+                k[::-1] for k in _prefixed(reversed_keys, parts[-1][::-1])
+                )
+        else:
+            candidates = keys
+        regex = re.compile('.*'.join(re.escape(p) for p in parts), re.DOTALL)
+        return self._ranked_matches(
+            (k for k in candidates if regex.fullmatch(k)), limit
+            )
+
+    def lookup_meaning(self, query: str, limit: int = None):
+        """Entries with English meanings matching a query
+
+        Words in the query must all appear in one entry's meanings, words in
+        double quotes must appear together in a single meaning, and OR
+        separates alternative queries. The entries are ordered from most to
+        least common, and at most limit of them are returned.
+
+        >>> eat = Entry('たべる', ('ichidan verb',), ('to eat', 'to live on'))
+        >>> drink = Entry('のむ', ('godan verb',), ('to drink', 'to swallow'))
+        >>> words = Jisho([eat, drink])
+        >>> [str(e) for e in words.lookup_meaning('to')]
+        ['たべる', 'のむ']
+        >>> [str(e) for e in words.lookup_meaning('eat OR swallow')]
+        ['たべる', 'のむ']
+        >>> [str(e) for e in words.lookup_meaning('"to drink" OR "to on"')]
+        ['のむ']
+        """
+        matches = set()
+        for clause in re.split(r'\s+OR\s+', query.strip()):
+            phrases = [
+                tokenize(phrase or word)
+                for phrase, word in re.findall(r'"([^"]*)"|(\S+)', clause)
+                ]
+            phrases = [p for p in phrases if p]
+            if not phrases:
+                continue
+            words = sorted(
+                {w for p in phrases for w in p},
+                key=lambda w: len(self._by_word.get(w, ()))
+                )
+            found = set(self._by_word.get(words[0], ()))
+            for word in words[1:]:
+                found.intersection_update(self._by_word.get(word, ()))
+            for phrase in phrases:
+                if len(phrase) > 1:
+                    found = {
+                        i for i in found
+                        if any(_has_phrase(tokenize(m), phrase)
+                               for m in self._by_id[i].meanings)
+                        }
+            matches.update(found)
+        return self._ranked(matches, limit)
+
+
+def _remove_id(index, key, i):
+    ids = index[key]
+    ids.remove(i)
+    if not ids:
+        del index[key]
+
+
+def _rank_key(entry, i):
+    """Sort key putting entries in order from most to least common"""
+    return entry.prevalence.rank, entry.reading, entry.kanji, i
+
+
+def _has_phrase(words, phrase):
+    size = len(phrase)
+    return any(
+        words[i:i + size] == phrase for i in range(len(words) - size + 1)
+        )
+
+
+# The most entries lookup_prefix keeps for a prefix. Only prefixes matching
+# more keys than that keep them, which bounds how many prefixes are kept.
+_prefix_top_size = 100
+
+
+def _prefixed(sorted_keys, prefix):
+    """Slice of sorted_keys starting with prefix"""
+    start = bisect.bisect_left(sorted_keys, prefix)
+    end = bisect.bisect_left(sorted_keys, prefix + chr(sys.maxunicode), start)
+    return sorted_keys[start:end]
+
 
+class FrozenJisho(collections.abc.Set):
+    """A Jisho that cannot change, which threads can share without locks
 
-def create_dictionary():
-    tree = ElementTree.parse(_dict_file)
-    return Jisho(Entry.from_node(node) for node in tree.getroot())
+    The indexes are plain dicts of tuples of ids, each already in order from
+    most to least common, and are never written after the FrozenJisho is
+    built. The only writes are to the caches of matches per part of speech
+    phrase and of the most common entries per prefix, each storing a value
+    that is the same whichever thread works it out, and a single dict
+    assignment is atomic.
+
+    To change it, change a copy and freeze that, as JishoHandle.edit does.
+
+    >>> words = FrozenJisho([
+    ...     Entry('たべる', ('ichidan verb',), ('to eat',), kanji='食べる'),
+    ...     Entry('のむ', ('godan verb',), ('to drink',), kanji='飲む'),
+    ...     ])
+    >>> [str(e) for e in words.lookup_meaning('to')]
+    ['食べる', '飲む']
+    >>> words.lookup_reading('みる')
+    set()
+    >>> changed = words.copy()
+    >>> changed.discard(next(iter(words.lookup_kanji('飲む'))))
+    >>> len(changed.freeze()), len(words)
+    (1, 2)
+    """
+
+    def __init__(self, entries=()):
+        if not isinstance(entries, Jisho):
+            entries = Jisho(entries)
+        self._entries = dict(entries._entries)
+        self._by_id = dict(entries._by_id)
+        self._next_id = entries._next_id
+        self._ranks = dict(entries._ranks)
+        rank = self._ranks.__getitem__
+        for name in ('_by_reading', '_by_kanji', '_by_part_of_speech',
+                     '_by_kanji_alternate', '_by_word'):
+            setattr(self, name, {
+                key: tuple(sorted(ids, key=rank))
+                for key, ids in getattr(entries, name).items() if ids
+                })
+        self.parts_of_speech = frozenset(entries.parts_of_speech)
+        self._pos_by_word = {
+            word: frozenset(tags)
+            for word, tags in entries._pos_by_word.items()
+            }
+        self._pos_by_phrase = {}
+        self._pos_matches = {}
+        self._sorted_text = None
+        self._text_keys()
+        self._prefix_tops = {}
+        self.precomputed = {
+            name: dict(values) for name, values in entries.precomputed.items()
+            }
+        self.details = entries.details
+
+    __contains__ = Jisho.__contains__
+    __iter__ = Jisho.__iter__
+    __len__ = Jisho.__len__
+    # A mutable Jisho with the same entries
+    copy = Jisho.copy
+
+    def _ranked_list(self, name, key):
+        return getattr(self, '_by_' + name).get(key, ())
+
+    _entries_of = Jisho._entries_of
+    _ranked = Jisho._ranked
+    _parts_of_speech_containing = Jisho._parts_of_speech_containing
+    lookup_part_of_speech = Jisho.lookup_part_of_speech
+    top_part_of_speech = Jisho.top_part_of_speech
+    lookup_reading = Jisho.lookup_reading
+    top_reading = Jisho.top_reading
+    lookup_kanji = Jisho.lookup_kanji
+    top_kanji = Jisho.top_kanji
+    _text_indexes = Jisho._text_indexes
+    _text_keys = Jisho._text_keys
+    _ranked_matches = Jisho._ranked_matches
+    lookup_prefix = Jisho.lookup_prefix
+    lookup_wildcard = Jisho.lookup_wildcard
+    lookup_meaning = Jisho.lookup_meaning
+
+
+def iter_entries(dict_file=_dict_file, entry_type=Entry, workers=1):
+    """Stream entries out of a JMdict file one <entry> at a time
+
+    Each element is cleared as soon as it has been converted, so peak memory
+    stays at the size of the entries produced plus a single <entry> subtree,
+    rather than the full XML tree (several hundred MB for JMdict_e.xml).
+    Target: no more than 10 MB above the memory held by the entries.
+
+    With more than one worker, or None for one per CPU, the file is parsed
+    in chunks by a pool of processes instead. The entries still come out in
+    the order of the file.
+    """
+    if workers != 1:
+        yield from _iter_entries_parallel(dict_file, entry_type, workers)
+        return
+    context = ElementTree.iterparse(dict_file, events=('start', 'end'))
+    _, root = next(context)
+    for event, node in context:
+        if event == 'end' and node.tag == 'entry':
+            yield entry_type.from_node(node)
+            root.clear()
+
+
+_chunk_size = 5000
+_chunk_header = None
+
+
+def _entry_spans(data, start):
+    """Byte ranges of each <entry> in JMdict text, from its first one"""
+    while True:
+        found = data.find(b'</entry>', start)
+        if found < 0:
+            return
+        end = found + len(b'</entry>')
+        yield start, end
+        start = end
+
+
+def _entry_chunks(dict_file, chunk_size):
+    """Split a JMdict file into the text before its first <entry> and byte
+    ranges each holding chunk_size entries"""
+    with open(dict_file, 'rb') as f, \
+            mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        start = end = data.find(b'<entry>')
+        header = data[:start]
+        chunks = []
+        for count, (_, end) in enumerate(_entry_spans(data, start), 1):
+            if count % chunk_size == 0:
+                chunks.append((start, end))
+                start = end
+        if end > start:
+            chunks.append((start, end))
+    return header, chunks
+
+
+def _init_chunk_worker(header):
+    global _chunk_header
+    _chunk_header = header
+
+
+def _parse_chunk(job):
+    dict_file, entry_type, start, end = job
+    with open(dict_file, 'rb') as f:
+        f.seek(start)
+        body = f.read(end - start)
+    root = ElementTree.fromstring(_chunk_header + body + b'</JMdict>')
+    return [entry_type.from_node(node) for node in root]
+
+
+def _iter_entries_parallel(dict_file, entry_type, workers):
+    header, chunks = _entry_chunks(dict_file, _chunk_size)
+    jobs = [(dict_file, entry_type, start, end) for start, end in chunks]
+    with multiprocessing.Pool(workers, _init_chunk_worker, (header,)) as pool:
+        for entries in pool.imap(_parse_chunk, jobs):
+            yield from entries
+
+
+_entity_declaration = re.compile(rb'<!ENTITY\s+(\S+)\s+"([^"]*)">')
+_entity_reference = re.compile(rb'&([\w.-]+);')
+
+
+def _entry_offsets(dict_file):
+    """The entities a JMdict file declares, and the sequence numbers of its
+    entries in order with their byte ranges"""
+    with open(dict_file, 'rb') as f, \
+            mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        first = data.find(b'<entry>')
+        entities = {
+            name: value.replace(b'&', b'&amp;').replace(b'<', b'&lt;')
+            for name, value in _entity_declaration.findall(data[:first])
+            }
+        spans = []
+        for start, end in _entry_spans(data, first):
+            found = data.find(b'<ent_seq>', start, end)
+            if found >= 0:
+                found += len(b'<ent_seq>')
+                sequence = int(data[found:data.find(b'</ent_seq>', found)])
+                spans.append((sequence, start, end))
+    spans.sort()
+    sequences = _id_array(span[0] for span in spans)
+    starts = _id_array(span[1] for span in spans)
+    ends = _id_array(span[2] for span in spans)
+    return entities, sequences, starts, ends
+
+
+class EntryDetails:
+    """Reads the full details of entries from a JMdict file, when asked
+
+    Only the byte range of each <entry> is kept, by its sequence number,
+    and an entry's element is parsed each time its details are looked up,
+    with the entities the file declares put in by hand rather than by
+    parsing the file's DTD again.
+
+    >>> import os, tempfile, synthetic
+    >>> with tempfile.TemporaryDirectory() as directory:
+    ...     path = os.path.join(directory, 'JMdict_e.xml')
+    ...     synthetic.write_synthetic(path, entries=10)
+    ...     words = create_dictionary(path, details=True)
+    ...     entry = max(words, key=lambda e: e.sequence)
+    ...     details = words.details[entry]
+    >>> details.readings[0].text == entry.reading
+    True
+    >>> details.senses[0].parts_of_speech == entry.parts_of_speech
+    True
+    >>> len(details.senses) >= 1
+    True
+    """
+
+    def __init__(self, dict_file=_dict_file, offsets=None):
+        self.dict_file = dict_file
+        # The entities and arrays of sequence numbers, each entry's start
+        # and its end, which snapshots save so as not to scan the file
+        self.offsets = offsets or _entry_offsets(dict_file)
+        self._entities, self._sequences, self._starts, self._ends = (
+            self.offsets
+            )
+
+    def _entity(self, match):
+        return self._entities.get(match.group(1), match.group())
+
+    def _span(self, entry):
+        sequences = self._sequences
+        i = bisect.bisect_left(sequences, entry.sequence or 0)
+        if i == len(sequences) or sequences[i] != entry.sequence:
+            raise KeyError(entry)
+        return self._starts[i], self._ends[i]
+
+    def __contains__(self, entry):
+        try:
+            self._span(entry)
+        except KeyError:
+            return False
+        return True
+
+    def __getitem__(self, entry):
+        start, end = self._span(entry)
+        with open(self.dict_file, 'rb') as f:
+            f.seek(start)
+            text = f.read(end - start)
+        node = ElementTree.fromstring(
+            _entity_reference.sub(self._entity, text)
+            )
+        return Details.from_node(node)
+
+
+def _source_stamp(dict_file):
+    stat = os.stat(dict_file)
+    return stat.st_size, stat.st_mtime_ns
+
+
+def save_snapshot(dictionary, snapshot_file=_snapshot_file,
+                  dict_file=_dict_file):
+    """Write a parsed Jisho to disk, stamped with its source file
+
+    Entries are stored as plain tuples, with parts of speech as positions in
+    a shared vocabulary, beside an array of their ids. The indexes' arrays
+    of ids are stored as they are, so loading needs neither the XML parser
+    nor decode_chars. Values in dictionary.precomputed are kept by id, and
+    where in the file the dictionary.details are read from, if anywhere.
+    """
+    ids = dictionary._entries
+    entries = list(ids)
+    vocabulary = sorted({p for e in entries for p in e.parts_of_speech})
+    pos_position = {p: i for i, p in enumerate(vocabulary)}
+
+    def index_ids(index):
+        # A FrozenJisho holds tuples, which a loaded Jisho couldn't change
+        return {
+            key: _id_array(values) for key, values in index.items() if values
+            }
+
+    data = {
+        'version': _snapshot_version,
+        'source': _source_stamp(dict_file),
+        'parts_of_speech': vocabulary,
+        'entries': [
+            (e.reading, tuple(pos_position[p] for p in e.parts_of_speech),
+             e.meanings, e.kanji, e.kanji_alternates,
+             _prevalence_values(e.prevalence),
+             e.sequence)
+            for e in entries
+            ],
+        'ids': _id_array(ids[e] for e in entries),
+        'by_reading': index_ids(dictionary._by_reading),
+        'by_kanji': index_ids(dictionary._by_kanji),
+        'by_part_of_speech': index_ids(dictionary._by_part_of_speech),
+        'by_kanji_alternate': index_ids(dictionary._by_kanji_alternate),
+        'by_word': index_ids(dictionary._by_word),
+        'precomputed': {
+            name: {ids[e]: v for e, v in values.items() if e in ids}
+            for name, values in dictionary.precomputed.items()
+            },
+        'details': dictionary.details and dictionary.details.offsets,
+        }
+    temp_file = snapshot_file + '.tmp'
+    with open(temp_file, 'wb') as f:
+        pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temp_file, snapshot_file)
+
+
+def load_snapshot(snapshot_file=_snapshot_file, dict_file=_dict_file,
+                  entry_type=Entry):
+    """Load a Jisho saved by save_snapshot
+
+    Returns None if there is no snapshot, or if it was built by another
+    version of this module or from a JMdict file with a different size or
+    modification time. With dict_file=None, the snapshot is loaded whatever
+    file it was built from.
+
+    >>> import os, tempfile, synthetic
+    >>> with tempfile.TemporaryDirectory() as directory:
+    ...     path = os.path.join(directory, 'JMdict_e.xml')
+    ...     snapshot = os.path.join(directory, 'jisho.pickle')
+    ...     synthetic.write_synthetic(path, entries=20)
+    ...     words = create_dictionary(path)
+    ...     save_snapshot(words, snapshot, path)
+    ...     same = load_snapshot(snapshot, path) == words
+    ...     stamp = os.stat(path)
+    ...     os.utime(path, ns=(stamp.st_atime_ns, stamp.st_mtime_ns + 10**9))
+    ...     touched = load_snapshot(snapshot, path)
+    ...     synthetic.write_synthetic(path, entries=30)
+    ...     rewritten = load_snapshot(snapshot, path)
+    ...     anyway = load_snapshot(snapshot, None) == words
+    >>> same, touched, rewritten, anyway
+    (True, None, None, True)
+    """
+    return _without_collection(
+        _load_snapshot, snapshot_file, dict_file, entry_type
+        )
+
+
+def _without_collection(func, *args):
+    # Collection passes over the freshly made objects are pure overhead
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        return func(*args)
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+
+
+def _load_snapshot(snapshot_file, dict_file, entry_type, check_source=True):
+    try:
+        with open(snapshot_file, 'rb') as f:
+            data = pickle.load(f)
+    except (OSError, EOFError, pickle.UnpicklingError):
+        return None
+    if data.get('version') != _snapshot_version:
+        return None
+    if (check_source and dict_file is not None
+            and data['source'] != _source_stamp(dict_file)):
+        return None
+    vocabulary = [sys.intern(p) for p in data['parts_of_speech']]
+    prevalence_type = entry_type._prevalence_type
+    entries = [
+        entry_type(reading, tuple(vocabulary[i] for i in pos), meanings,
+                   kanji, alternates, prevalence_type(*prev), sequence)
+        for reading, pos, meanings, kanji, alternates, prev, sequence
+        in data['entries']
+        ]
+    ids = data['ids']
+    dictionary = Jisho(())
+    dictionary._entries = dict(zip(entries, ids))
+    dictionary._by_id = dict(zip(ids, entries))
+    dictionary._next_id = min(0, min(ids, default=0)) - 1
+    dictionary._ranks = {i: _rank_key(e, i) for i, e in zip(ids, entries)}
+    for name in ('by_reading', 'by_kanji', 'by_part_of_speech',
+                 'by_kanji_alternate', 'by_word'):
+        getattr(dictionary, '_' + name).update(data[name])
+    by_id = dictionary._by_id
+    for name, values in data['precomputed'].items():
+        dictionary.precomputed[name] = {by_id[i]: v for i, v in values.items()}
+    for pos in vocabulary:
+        dictionary._add_part_of_speech(pos)
+    if data['details'] and dict_file is not None:
+        dictionary.details = EntryDetails(dict_file, data['details'])
+    return dictionary
+
+
+def build_snapshot(dict_file=_dict_file, snapshot_file=_snapshot_file,
+                   entry_type=Entry, workers=1, details=False):
+    """Parse a JMdict file and save it as a snapshot"""
+    dictionary = Jisho(iter_entries(dict_file, entry_type, workers))
+    if details:
+        dictionary.details = EntryDetails(dict_file)
+    save_snapshot(dictionary, snapshot_file, dict_file)
+    return dictionary
+
+
+def diff_entries(dictionary, entries):
+    """Compare a Jisho with new entries, such as those of a newer JMdict
+
+    Entries are matched by their sequence numbers, or by their contents if
+    they have none. Returns a list of the new entries that match none in
+    the dictionary, a list of the dictionary's entries that no new entry
+    matches and a list of (old, new) pairs of matching entries that differ.
+    """
+    added = []
+    changed = []
+    kept = set()
+    for entry in entries:
+        i = dictionary._entries.get(entry)
+        if i is None:
+            added.append(entry)
+            continue
+        kept.add(i)
+        old = dictionary._by_id[i]
+        if _contents(old) != _contents(entry):
+            changed.append((old, entry))
+    removed = [e for e, i in dictionary._entries.items() if i not in kept]
+    return added, removed, changed
+
+
+def apply_diff(dictionary, added, removed, changed):
+    """Change a Jisho in place by a diff from diff_entries"""
+    for entry in removed:
+        dictionary.discard(entry)
+    for old, new in changed:
+        dictionary.discard(old)
+        dictionary.add(new)
+    for entry in added:
+        dictionary.add(entry)
+
+
+class JishoHandle:
+    """Holds the current version of a Jisho, which updates replace whole
+
+    Readers look entries up in handle.dictionary. An update changes a copy
+    of the dictionary and then swaps it in, so readers carry on with a
+    consistent dictionary throughout, old or new, and never a mix. A
+    FrozenJisho is updated through a mutable copy, which is frozen again
+    before it is swapped in.
+
+    >>> eat = Entry('たべる', ('ichidan verb',), ('to eat',), sequence=1)
+    >>> drink = Entry('のむ', ('godan verb',), ('to drink',), sequence=2)
+    >>> handle = JishoHandle(Jisho([eat, drink]))
+    >>> old = handle.dictionary
+    >>> added, removed, changed = handle.update([
+    ...     Entry('たべる', ('ichidan verb',), ('to eat', 'to live on'),
+    ...           sequence=1),
+    ...     Entry('みる', ('ichidan verb',), ('to see',), sequence=3),
+    ...     ])
+    >>> len(added), len(removed), len(changed)
+    (1, 1, 1)
+    >>> [e.meanings for e in handle.dictionary.lookup_reading('たべる')]
+    [('to eat', 'to live on')]
+    >>> [e.meanings for e in old.lookup_reading('たべる')]
+    [('to eat',)]
+    """
+
+    def __init__(self, dictionary):
+        self.dictionary = dictionary
+        self._update_lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def edit(self):
+        """Change a copy of the dictionary, swapped in at the end
+
+        >>> handle = JishoHandle(FrozenJisho())
+        >>> with handle.edit() as dictionary:
+        ...     dictionary.add(Entry('みる', ('ichidan verb',), ('to see',)))
+        >>> type(handle.dictionary).__name__, len(handle.dictionary)
+        ('FrozenJisho', 1)
+        """
+        with self._update_lock:
+            current = self.dictionary
+            updated = current.copy()
+            yield updated
+            if isinstance(current, FrozenJisho):
+                updated = updated.freeze()
+            self.dictionary = updated
+
+    def update(self, entries):
+        """Bring the dictionary in line with new entries
+
+        Returns the diff that was applied, as from diff_entries.
+        """
+        with self.edit() as updated:
+            diff = diff_entries(updated, entries)
+            apply_diff(updated, *diff)
+        return diff
+
+    def reload(self, dict_file=_dict_file, entry_type=Entry, workers=1):
+        """Update the dictionary from a newer JMdict file"""
+        with self.edit() as updated:
+            diff = diff_entries(
+                updated, iter_entries(dict_file, entry_type, workers)
+                )
+            apply_diff(updated, *diff)
+            if updated.details is not None:
+                updated.details = EntryDetails(dict_file)
+        return diff
+
+
+def update_snapshot(dict_file=_dict_file, snapshot_file=_snapshot_file,
+                    entry_type=Entry, workers=1, details=False):
+    """Bring a snapshot in line with a newer JMdict file
+
+    Only the entries that were added, removed or changed are applied to
+    the dictionary in the snapshot, rather than building it anew, and the
+    snapshot is saved as built from the new file. Details are saved again
+    if the snapshot had them, or if details is true. Returns the dictionary
+    and the diff that was applied.
+    """
+    dictionary = _without_collection(
+        _load_snapshot, snapshot_file, dict_file, entry_type, False
+        )
+    if dictionary is None:
+        raise ValueError('{} is not a current snapshot'.format(snapshot_file))
+    diff = diff_entries(
+        dictionary, iter_entries(dict_file, entry_type, workers)
+        )
+    apply_diff(dictionary, *diff)
+    if details or dictionary.details is not None:
+        # The saved offsets are those of entries in the old file
+        dictionary.details = EntryDetails(dict_file)
+    save_snapshot(dictionary, snapshot_file, dict_file)
+    return dictionary, diff
+
+
+def _instrumented_stages():
+    """The functions each stage of loading runs, by stage name"""
+    module = sys.modules[__name__]
+    return {
+        'decode_chars': [(module, 'decode_chars')],
+        'from_nodes': [(Prevalence, 'from_nodes'),
+                       (CompactPrevalence, 'from_nodes')],
+        'from_node': [(Entry, 'from_node'), (CompactEntry, 'from_node')],
+        'add': [(Jisho, 'add')],
+        }
+
+
+# The recorders of the instrument contexts active in the current thread or
+# task, and the functions replaced while any context is active anywhere
+_stage_recorders = contextvars.ContextVar('_stage_recorders', default=())
+_instrument_lock = threading.Lock()
+_instrumented_originals = []
+_instrument_users = 0
+
+
+def _timed_stage(stage, func):
+    """func, passing the time and memory of each call to the recorders"""
+    traced = tracemalloc.get_traced_memory
+
+    def wrapper(*args, **kwargs):
+        recorders = _stage_recorders.get()
+        if not recorders:
+            return func(*args, **kwargs)
+        tracing = tracemalloc.is_tracing()
+        memory = traced()[0] if tracing else 0
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            size = traced()[0] - memory if tracing else 0
+            for record in recorders:
+                record(stage, elapsed, size)
+
+    return wrapper
+
+
+def _install_stage_timers():
+    global _instrument_users
+    with _instrument_lock:
+        if not _instrument_users:
+            for stage, targets in _instrumented_stages().items():
+                for owner, name in targets:
+                    original = vars(owner)[name]
+                    if isinstance(original, classmethod):
+                        # Still called with the class it is looked up on,
+                        # such as a subclass of Entry
+                        timed = classmethod(
+                            _timed_stage(stage, original.__func__)
+                            )
+                    else:
+                        timed = _timed_stage(stage, original)
+                    _instrumented_originals.append((owner, name, original))
+                    setattr(owner, name, timed)
+        _instrument_users += 1
+
+
+def _remove_stage_timers():
+    global _instrument_users
+    with _instrument_lock:
+        _instrument_users -= 1
+        if not _instrument_users:
+            for owner, name, original in _instrumented_originals:
+                setattr(owner, name, original)
+            _instrumented_originals.clear()
+
+
+@contextlib.contextmanager
+def instrument(stats, hook=None):
+    """Record where the time goes while dictionaries are loaded
+
+    For each stage of loading (decode_chars, Prevalence.from_nodes,
+    Entry.from_node and Jisho.add) the number of calls and the seconds
+    spent in them are added to stats, under keys such as 'add_calls' and
+    'add_seconds'. The times include the stages called inside a stage.
+    While tracemalloc is tracing, the bytes each stage leaves allocated
+    are added up too, under keys such as 'add_allocated'. If a hook is
+    given, it is called with the stage name, seconds and bytes allocated
+    after every call.
+
+    Only calls made in the same thread or asyncio task are counted, and
+    only calls in this process, so parsing with more than one worker
+    leaves the parsing stages out. Contexts may overlap, each counting
+    into its own stats.
+
+    >>> stats = {}
+    >>> with instrument(stats):
+    ...     words = Jisho([Entry('のむ', ('godan verb',), ('to drink',))])
+    >>> stats['add_calls']
+    1
+    """
+    tracing = tracemalloc.is_tracing()
+    keys = {}
+    for stage in _instrumented_stages():
+        keys[stage] = calls, seconds, allocated = (
+            stage + '_calls', stage + '_seconds', stage + '_allocated'
+            )
+        stats.setdefault(calls, 0)
+        stats.setdefault(seconds, 0.0)
+        if tracing:
+            stats.setdefault(allocated, 0)
+
+    def record(stage, elapsed, size):
+        calls, seconds, allocated = keys[stage]
+        stats[calls] += 1
+        stats[seconds] += elapsed
+        if tracing:
+            stats[allocated] += size
+        if hook is not None:
+            hook(stage, elapsed, size)
+
+    _install_stage_timers()
+    _stage_recorders.set(_stage_recorders.get() + (record,))
+    try:
+        yield stats
+    finally:
+        # Not reset to a token, as another context may have started since
+        _stage_recorders.set(
+            tuple(r for r in _stage_recorders.get() if r is not record)
+            )
+        _remove_stage_timers()
+
+
+def index_sizes(dictionary):
+    """Number of keys in each of a Jisho's indexes"""
+    return {
+        name: len(getattr(dictionary, '_' + name))
+        for name in ('by_reading', 'by_kanji', 'by_part_of_speech',
+                     'by_kanji_alternate', 'by_word')
+        }
+
+
+def create_dictionary(dict_file=_dict_file, snapshot=None, entry_type=Entry,
+                      workers=1, stats=None, details=False):
+    """Load the JMdict dictionary
+
+    If snapshot is True or a file path, the dictionary is loaded from that
+    snapshot when it is still current, or else parsed and saved to it.
+    Pass entry_type=CompactEntry to hold the entries in less memory, and
+    workers=None to parse with one process per CPU.
+
+    Entries hold the first reading and sense of their word. With
+    details=True, dictionary.details reads every reading, kanji and sense
+    of an entry from the file when asked, and where each entry is in the
+    file is saved with the snapshot.
+
+    If stats is a dict, the counts that instrument records are added to
+    it, along with the total seconds taken, the seconds outside the other
+    stages (mostly XML parsing, or reading the snapshot), the entries
+    loaded per second and the index_sizes.
+    """
+    if stats is not None:
+        start = time.perf_counter()
+        with instrument(stats):
+            dictionary = create_dictionary(
+                dict_file, snapshot, entry_type, workers, details=details
+                )
+        total = time.perf_counter() - start
+        stats['total_seconds'] = total
+        stats['parse_seconds'] = (
+            total - stats['from_node_seconds'] - stats['add_seconds']
+            )
+        stats['entries'] = len(dictionary)
+        stats['entries_per_second'] = len(dictionary) / total
+        stats['index_sizes'] = index_sizes(dictionary)
+        return dictionary
+    if not snapshot:
+        dictionary = Jisho(iter_entries(dict_file, entry_type, workers))
+        if details:
+            dictionary.details = EntryDetails(dict_file)
+        return dictionary
+    snapshot_file = _snapshot_file if snapshot is True else snapshot
+    dictionary = load_snapshot(snapshot_file, dict_file, entry_type)
+    if dictionary is None:
+        dictionary = build_snapshot(
+            dict_file, snapshot_file, entry_type, workers, details
+            )
+    elif details and dictionary.details is None:
+        dictionary.details = EntryDetails(dict_file)
+        save_snapshot(dictionary, snapshot_file, dict_file)
+    return dictionary
+
+
+def _print_stats(stats):
+    for key, value in stats.items():
+        if isinstance(value, dict):
+            print('{}:'.format(key))
+            for name, size in value.items():
+                print('    {}: {}'.format(name, size))
+        elif isinstance(value, float):
+            print('{}: {:.4g}'.format(key, value))
+        else:
+            print('{}: {}'.format(key, value))
 
 if __name__ == '__main__':
-    dictionary = create_dictionary()
+    import argparse
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('dict_file', nargs='?', default=_dict_file)
+    parser.add_argument(
+        '--build-snapshot', metavar='PATH', nargs='?', const=_snapshot_file,
+        help='parse the dictionary and save a snapshot of it'
+        )
+    parser.add_argument(
+        '--update-snapshot', metavar='PATH', nargs='?', const=_snapshot_file,
+        help='apply the changes in the dictionary to an existing snapshot'
+        )
+    parser.add_argument(
+        '--workers', type=int, default=1,
+        help='processes to parse with, or 0 for one per CPU'
+        )
+    parser.add_argument(
+        '--stats', action='store_true',
+        help='report the time and memory each stage of loading takes'
+        )
+    args = parser.parse_args()
+    workers = args.workers or None
+    if args.stats:
+        tracemalloc.start()
+        stats = {}
+        dictionary = create_dictionary(
+            args.dict_file, workers=workers, stats=stats
+            )
+        stats['peak_memory'] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        _print_stats(stats)
+    elif args.update_snapshot:
+        dictionary, (added, removed, changed) = update_snapshot(
+            args.dict_file, args.update_snapshot, workers=workers
+            )
+        print('{} added, {} removed, {} changed'.format(
+            len(added), len(removed), len(changed)
+            ))
+    elif args.build_snapshot:
+        dictionary = build_snapshot(
+            args.dict_file, args.build_snapshot, workers=workers
+            )
+    else:
+        dictionary = create_dictionary(args.dict_file, workers=workers)
@@ -0,0 +1,105 @@
+"""Load test a running serve.py
+
+Opens many keep-alive connections at once, each sending a run of
+requests, and reports the requests answered per second and latencies:
+    python loadtest.py [--host HOST] [--port PORT] [--connections N]
+                       [--requests N]
+
+Each connection needs a file descriptor on both ends, so raise the limit
+on open files (ulimit -n) for thousands of connections.
+"""
+import argparse
+import asyncio
+import time
+import urllib.parse
+
+
+_requests = (
+    ('/lookup', {'reading': 'たべる'}),
+    ('/lookup', {'meaning': 'eat', 'limit': '10'}),
+    ('/lookup', {'part_of_speech': 'verb', 'limit': '10'}),
+    ('/prefix', {'text': 'た', 'limit': '10'}),
+    ('/conjugate', {'verb': 'たべる'}),
+    ('/transliterate', {'text': 'kyou ha ame ga futte iru'}),
+    )
+
+
+def _request(host, path, arguments):
+    target = path + '?' + urllib.parse.urlencode(arguments)
+    return 'GET {} HTTP/1.1\r\nHost: {}\r\n\r\n'.format(
+        target, host
+        ).encode('utf-8')
+
+
+async def _read_response(reader):
+    head = await reader.readuntil(b'\r\n\r\n')
+    status = int(head.split(b' ', 2)[1])
+    size = 0
+    for line in head.split(b'\r\n'):
+        name, _, value = line.partition(b':')
+        if name.strip().lower() == b'content-length':
+            size = int(value)
+    await reader.readexactly(size)
+    return status
+
+
+async def _client(host, port, requests, count, latencies, errors):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        for i in range(count):
+            start = time.perf_counter()
+            writer.write(requests[i % len(requests)])
+            status = await _read_response(reader)
+            latencies.append(time.perf_counter() - start)
+            if status != 200:
+                errors.append(status)
+    finally:
+        writer.close()
+
+
+async def load_test(host, port, connections, count):
+    """Time connections clients sending count requests each"""
+    requests = [_request(host, p, a) for p, a in _requests]
+    latencies = []
+    errors = []
+    start = time.perf_counter()
+    results = await asyncio.gather(*(
+        _client(host, port, requests[i % len(requests):] + requests, count,
+                latencies, errors)
+        for i in range(connections)
+        ), return_exceptions=True)
+    seconds = time.perf_counter() - start
+    failures = [r for r in results if isinstance(r, Exception)]
+    latencies.sort()
+
+    def percentile(p):
+        if not latencies:
+            return float('nan')
+        return 1000 * latencies[min(len(latencies) - 1,
+                                    int(p * len(latencies)))]
+
+    return {
+        'requests': len(latencies),
+        'requests_per_s': len(latencies) / seconds,
+        'p50_ms': percentile(0.5),
+        'p99_ms': percentile(0.99),
+        'error_responses': len(errors),
+        'failed_connections': len(failures),
+        }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--connections', type=int, default=1000)
+    parser.add_argument('--requests', type=int, default=20,
+                        help='requests sent on each connection')
+    args = parser.parse_args()
+    results = asyncio.run(
+        load_test(args.host, args.port, args.connections, args.requests)
+        )
+    for name, value in results.items():
+        print('{}: {}'.format(
+            name, '{:.4g}'.format(value) if isinstance(value, float) else value
+            ))
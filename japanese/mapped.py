@@ -0,0 +1,246 @@
+"""Share a read-only dictionary between processes through a memory map
+
+The file holds an entry table plus a sorted key table and a table of entry
+positions for each of the reading, kanji and part of speech indexes.
+Every table is an array of offsets followed by a blob of bytes, so lookups
+are binary searches straight over the mapped pages: processes mapping the
+same file share them through the OS page cache, and an entry only becomes
+an Entry object when a lookup returns it.
+"""
+import array
+import collections.abc
+import mmap
+import os
+import struct
+from dataclasses import astuple
+
+import jisho
+
+
+_magic = b'JMAP'
+_version = 2
+_header = struct.Struct('4sII')
+_count = struct.Struct('I')
+_field_separator = '\x1e'
+_item_separator = '\x1f'
+
+
+def _encode_entry(entry):
+    prevalence = (
+        '' if p is None else str(p) for p in astuple(entry.prevalence)
+        )
+    fields = (
+        entry.reading,
+        _item_separator.join(entry.parts_of_speech),
+        _item_separator.join(entry.meanings),
+        entry.kanji,
+        _item_separator.join(entry.kanji_alternates),
+        _item_separator.join(prevalence),
+        '' if entry.sequence is None else str(entry.sequence),
+        )
+    return _field_separator.join(fields).encode('utf-8')
+
+
+def _decode_entry(record, entry_type=jisho.Entry):
+    fields = str(record, 'utf-8').split(_field_separator)
+    reading, pos, meanings, kanji, alternates, prevalence, sequence = fields
+
+    def items(text):
+        return tuple(text.split(_item_separator)) if text else ()
+
+    prevalence = entry_type._prevalence_type(*(
+        int(p) if p else None for p in prevalence.split(_item_separator)
+        ))
+    return entry_type(
+        reading, items(pos), items(meanings), kanji, items(alternates),
+        prevalence, int(sequence) if sequence else None
+        )
+
+
+def _write_table(f, items):
+    """Write a count, an offset array and the items' bytes, 4-byte aligned"""
+    offsets = array.array('I', [0])
+    for item in items:
+        offsets.append(offsets[-1] + len(item))
+    f.write(_count.pack(len(items)))
+    f.write(offsets.tobytes())
+    for item in items:
+        f.write(item)
+    f.write(b'\0' * (-offsets[-1] % 4))
+
+
+class _Table:
+    """Sequence of byte strings read from a table written by _write_table"""
+
+    def __init__(self, buffer, position):
+        count, = _count.unpack_from(buffer, position)
+        start = position + _count.size
+        self._blob = start + 4 * (count + 1)
+        self._offsets = buffer[start:self._blob].cast('I')
+        self._buffer = buffer
+        size = self._offsets[-1]
+        self.end = self._blob + size + (-size % 4)
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i):
+        start = self._blob + self._offsets[i]
+        return self._buffer[start:self._blob + self._offsets[i + 1]]
+
+    def find(self, key):
+        """Binary search a table of sorted keys, returning -1 if missing"""
+        low, high = 0, len(self)
+        while low < high:
+            mid = (low + high) // 2
+            if bytes(self[mid]) < key:
+                low = mid + 1
+            else:
+                high = mid
+        if low < len(self) and self[low] == key:
+            return low
+        return -1
+
+
+class _Index:
+    def __init__(self, buffer, position):
+        self.keys = _Table(buffer, position)
+        self.positions = _Table(buffer, self.keys.end)
+        self.end = self.positions.end
+
+    def get(self, key):
+        i = self.keys.find(key.encode('utf-8'))
+        if i < 0:
+            return ()
+        return self.positions[i].cast('I')
+
+
+def write_mapped(dictionary, path):
+    """Save a Jisho in the format read by MappedJisho
+
+    The file is written beside its destination and moved into place, so
+    processes that already map the old file keep a consistent view of it.
+    """
+    entries = list(dictionary._entries)
+    # The indexes hold entry ids, which become positions in the entry table
+    position = {dictionary._entries[e]: i for i, e in enumerate(entries)}
+    temp_path = path + '.tmp'
+    with open(temp_path, 'wb') as f:
+        f.write(_header.pack(_magic, _version, len(entries)))
+        _write_table(f, [_encode_entry(e) for e in entries])
+        for index in (dictionary._by_reading, dictionary._by_kanji,
+                      dictionary._by_part_of_speech):
+            keys = sorted(k for k, v in index.items() if v)
+            _write_table(f, [k.encode('utf-8') for k in keys])
+            _write_table(f, [
+                array.array('I', sorted(position[i] for i in index[k]))
+                .tobytes()
+                for k in keys
+                ])
+    os.replace(temp_path, path)
+
+
+class MappedJisho(collections.abc.Set):
+    """Read-only Jisho backed by a file written with write_mapped
+
+    Lookups return entries of entry_type, as create_dictionary does.
+
+    >>> import os, tempfile
+    >>> words = jisho.Jisho([
+    ...     jisho.Entry('たべる', ('ichidan verb',), ('to eat',), kanji='食べる',
+    ...                 sequence=1),
+    ...     jisho.Entry('のむ', ('godan verb',), ('to drink',), kanji='飲む',
+    ...                 sequence=2),
+    ...     jisho.Entry('みず', ('noun',), ('water',), kanji='水'),
+    ...     ])
+    >>> with tempfile.TemporaryDirectory() as directory:
+    ...     path = os.path.join(directory, 'jisho.map')
+    ...     write_mapped(words, path)
+    ...     mapped = MappedJisho(path)
+    ...     same = (
+    ...         mapped.lookup_reading('たべる') == words.lookup_reading('たべる'),
+    ...         mapped.lookup_kanji('水') == words.lookup_kanji('水'),
+    ...         mapped.lookup_part_of_speech('verb')
+    ...         == set(words.lookup_part_of_speech('verb')),
+    ...         set(mapped) == set(words),
+    ...         )
+    ...     found = [str(e) for e in words if e in mapped]
+    ...     missing = jisho.Entry('いぬ', ('noun',), ('dog',)) in mapped
+    ...     mapped.close()
+    >>> same
+    (True, True, True, True)
+    >>> len(found), missing
+    (3, False)
+    """
+
+    def __init__(self, path, entry_type=jisho.Entry):
+        self._entry_type = entry_type
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._buffer = memoryview(self._map)
+        magic, version, count = _header.unpack_from(self._buffer)
+        if magic != _magic or version != _version:
+            self.close()
+            raise ValueError('{} is not a mapped dictionary'.format(path))
+        self._entries = _Table(self._buffer, _header.size)
+        self._by_reading = _Index(self._buffer, self._entries.end)
+        self._by_kanji = _Index(self._buffer, self._by_reading.end)
+        self._by_part_of_speech = _Index(self._buffer, self._by_kanji.end)
+        pos_keys = self._by_part_of_speech.keys
+        self._pos_keys = {
+            str(pos_keys[i], 'utf-8'): i for i in range(len(pos_keys))
+            }
+        self.parts_of_speech = set(self._pos_keys)
+
+    def close(self):
+        # Entry tables hold views into the map, which must be let go first
+        self._entries = self._by_reading = None
+        self._by_kanji = self._by_part_of_speech = None
+        self._buffer.release()
+        self._map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _entry(self, i):
+        return _decode_entry(self._entries[i], self._entry_type)
+
+    def __contains__(self, x):
+        return any(
+            self._entry(i) == x for i in self._by_reading.get(x.reading)
+            )
+
+    def __iter__(self):
+        return (self._entry(i) for i in range(len(self._entries)))
+
+    def __len__(self):
+        return len(self._entries)
+
+    def lookup_part_of_speech(self, phrase: str):
+        phrase = phrase.lower()
+        positions = set()
+        index = self._by_part_of_speech
+        for pos, i in self._pos_keys.items():
+            if phrase in pos:
+                positions.update(index.positions[i].cast('I'))
+        return {self._entry(i) for i in positions}
+
+    def lookup_reading(self, reading: str):
+        reading = reading.lower()
+        return {self._entry(i) for i in self._by_reading.get(reading)}
+
+    def lookup_kanji(self, kanji: str):
+        kanji = kanji.lower()
+        return {self._entry(i) for i in self._by_kanji.get(kanji)}
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('output', help='path of the mapped dictionary')
+    parser.add_argument('dict_file', nargs='?', default=jisho._dict_file)
+    args = parser.parse_args()
+    write_mapped(jisho.create_dictionary(args.dict_file), args.output)
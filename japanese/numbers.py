@@ -14,9 +14,36 @@ number_kanji = {
     1000: '千',
     10**4: '万',
     10**8: '億',
-    10**12: '兆'
+    10**12: '兆',
+    10**16: '京',
+    10**20: '垓',
+    10**24: '𥝱',
+    10**28: '穣',
+    10**32: '溝',
+    10**36: '澗',
+    10**40: '正',
+    10**44: '載',
+    10**48: '極',
     }
 
+# Units for each group of four digits, from the lowest
+_group_units = [''] + [number_kanji[10**i] for i in range(4, 52, 4)]
+
+
+def _group_to_kanji(i):
+    out = ''
+    for unit in (1000, 100, 10):
+        digit, i = divmod(i, unit)
+        if digit:
+            out += ('' if digit == 1 else number_kanji[digit]) + number_kanji[unit]
+    if i:
+        out += number_kanji[i]
+    return out
+
+
+# Kanji for every number under 10**4, without the ゼロ for 0
+_groups = [_group_to_kanji(i) for i in range(10**4)]
+
 
 def int_to_kanji(i: int):
     """
@@ -32,24 +59,101 @@ def int_to_kanji(i: int):
     '十二億三千四百五十六万七千八百九十'
     >>> int_to_kanji(10**8)
     '一億'
+    >>> int_to_kanji(2 * 10**16 + 10**4)
+    '二京一万'
     """
-    if i in {0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 100, 1000}:
-        return number_kanji[i]
-    remainder = i
-    threshholds = [10**12, 10**8, 10**4, 1000, 100, 10]
-    out = ''
-    for n in threshholds:
-        factor, remainder = divmod(remainder, n)
-        if factor:
-            if factor == 1 and n in {10, 100, 1000}:
-                out += number_kanji[n]
-            else:
-                out += int_to_kanji(factor) + number_kanji[n]
-        if not remainder:
+    if i < 10**4:
+        if i < 0:
+            raise ValueError('{} is negative'.format(i))
+        return _groups[i] or number_kanji[0]
+    if i >= 10**52:
+        raise ValueError('{} is too large'.format(i))
+    out = []
+    for unit in _group_units:
+        if not i:
             break
-    if remainder:
-        out += number_kanji[remainder]
-    return out
+        i, group = divmod(i, 10**4)
+        if group:
+            out.append(_groups[group] + unit)
+    return ''.join(reversed(out))
+
+
+def ints_to_kanji(values):
+    """Convert a sequence of integers, or a NumPy integer array, to kanji
+
+    >>> ints_to_kanji([3, 20, 10**12])
+    ['三', '二十', '一兆']
+    """
+    if hasattr(values, 'tolist'):
+        # NumPy's integer types are slower to divide than int
+        values = values.tolist()
+    return list(map(int_to_kanji, values))
+
+
+_kanji_values = {kanji: i for i, kanji in number_kanji.items()}
+_kanji_values.update({'〇': 0, '零': 0})
+
+
+def kanji_to_int(kanji: str):
+    """Read a number written in kanji, the reverse of int_to_kanji
+
+    Digits may also be written one per place, with 〇 for a zero. Anything
+    else, such as a unit repeated or out of order, raises ValueError.
+
+    >>> kanji_to_int('十二億三千四百五十六万七千八百九十')
+    1234567890
+    >>> kanji_to_int('二京一万')
+    20000000000010000
+    >>> kanji_to_int('ゼロ'), kanji_to_int('二〇二四')
+    (0, 2024)
+    """
+    if _kanji_values.get(kanji) == 0:
+        return 0
+    invalid = '{!r} is not a number'.format(kanji)
+    if not kanji:
+        raise ValueError(invalid)
+    total = group = 0
+    digits = None
+    # Each unit must be smaller than the one before it, the units under
+    # 10**4 starting again after each larger unit
+    small_limit = 10**4
+    large_limit = float('inf')
+    for char in kanji:
+        value = _kanji_values.get(char)
+        if value is None:
+            raise ValueError(invalid)
+        if value < 10:
+            digits = value if digits is None else digits * 10 + value
+            continue
+        if value < 10**4:
+            # A unit takes a single digit before it, and not a 〇
+            if value >= small_limit or digits is not None and (
+                    not 0 < digits < 10):
+                raise ValueError(invalid)
+            group += (digits or 1) * value
+            small_limit = value
+        else:
+            if value >= large_limit:
+                raise ValueError(invalid)
+            if group or digits is not None:
+                group = _group_value(group, digits, invalid)
+                if not group:
+                    raise ValueError(invalid)
+            total += (group or 1) * value
+            group = 0
+            small_limit = 10**4
+            large_limit = value
+        digits = None
+    return total + _group_value(group, digits, invalid)
+
+
+def _group_value(group, digits, invalid):
+    # Digits one per place can't follow a unit, as in 十二三
+    if digits is None:
+        return group
+    if group and digits >= 10:
+        raise ValueError(invalid)
+    return group + digits
 
 
 if __name__ == '__main__':
@@ -0,0 +1,106 @@
+"""Split Japanese text into the words of a dictionary
+
+The readings, kanji and alternate kanji of every entry go into one dict,
+along with each of their prefixes, which works as a trie: walking forward
+from a character, each longer piece of text is a single probe, and the
+walk stops as soon as a piece starts no word. Of the ways to split the
+text into those words, the one with the fewest characters left unknown,
+then the fewest words, then the most common words is picked.
+"""
+import jisho
+
+
+# Costs, chosen so that any number of words rank below one unknown
+# character and a word's rank only decides between equally long splits
+_unknown_cost = 10**12
+_word_cost = 10**6
+_missing = object()
+
+
+class Segmenter:
+    """Splits text into the words of a Jisho
+
+    The words are taken from the dictionary when the Segmenter is made, so
+    entries added to it later aren't seen.
+
+    >>> words = jisho.Jisho([
+    ...     jisho.Entry('にほん', ('noun',), ('Japan',), kanji='日本'),
+    ...     jisho.Entry('ご', ('noun',), ('language',), kanji='語'),
+    ...     jisho.Entry('にほんご', ('noun',), ('Japanese',), kanji='日本語'),
+    ...     jisho.Entry('を', ('particle',), ('object marker',)),
+    ...     jisho.Entry('はなす', ('godan verb',), ('to speak',), kanji='話す'),
+    ...     ])
+    >>> segmenter = Segmenter(words)
+    >>> segmenter.segment('日本語を話す')
+    ['日本語', 'を', '話す']
+    >>> segmenter.segment('にほんごをXでは話す')
+    ['にほんご', 'を', 'Xでは', '話す']
+    """
+
+    def __init__(self, dictionary):
+        # Each word maps to its cost, and each other prefix of one to None
+        self._words = {}
+        for entry in dictionary:
+            cost = _word_cost + entry.prevalence.rank
+            for word in (entry.reading, entry.kanji, *entry.kanji_alternates):
+                if not word:
+                    continue
+                known = self._words.get(word)
+                if known is None or known > cost:
+                    self._words[word] = cost
+                for i in range(1, len(word)):
+                    self._words.setdefault(word[:i], None)
+
+    def segment(self, text):
+        """Split text into a list of words
+
+        Runs of characters that start no word are kept together as one.
+        """
+        words = self._words
+        size = len(text)
+        # Start from every character unknown, and improve on that
+        best = [i * _unknown_cost for i in range(size + 1)]
+        back = [i - 1 for i in range(size + 1)]
+        unknown = [True] * (size + 1)
+        for start in range(size):
+            cost = best[start]
+            skip = cost + _unknown_cost
+            if skip < best[start + 1]:
+                best[start + 1] = skip
+                back[start + 1] = start
+                unknown[start + 1] = True
+            for end in range(start + 1, size + 1):
+                word_cost = words.get(text[start:end], _missing)
+                if word_cost is _missing:
+                    break
+                if word_cost is None:
+                    continue
+                total = cost + word_cost
+                if total < best[end]:
+                    best[end] = total
+                    back[end] = start
+                    unknown[end] = False
+        pieces = []
+        end = size
+        while end:
+            start = back[end]
+            if unknown[end] and pieces and pieces[-1][1]:
+                pieces[-1] = (text[start:end] + pieces[-1][0], True)
+            else:
+                pieces.append((text[start:end], unknown[end]))
+            end = start
+        return [piece for piece, _ in reversed(pieces)]
+
+    def iter_segments(self, lines):
+        """Split each line of an iterable, such as a file, into words
+
+        Only one line is held at a time, so files of any size can be split.
+        Yields a list of words for each line, without its line break.
+        """
+        for line in lines:
+            yield self.segment(line.rstrip('\r\n'))
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
@@ -0,0 +1,291 @@
+"""Serve the dictionary over HTTP, answering in JSON
+
+Run from this directory to load the dictionary once and answer requests:
+    python serve.py [dict_file] [--host HOST] [--port PORT] [--snapshot]
+
+GET endpoints take their arguments in the query string:
+    /lookup?reading=たべる (or kanji, meaning or part_of_speech, and limit)
+    /prefix?text=たべ&limit=10
+    /conjugate?verb=食べる
+    /transliterate?text=taberu&to=hiragana (or to=romanji)
+POST /batch takes a JSON list of [path, arguments] pairs, and answers with
+a list of their results, or of {"error": message} for those that failed.
+
+Connections are kept alive, and one process serves them all from a
+single event loop, so thousands of clients share one dictionary.
+"""
+import asyncio
+import json
+import traceback
+import urllib.parse
+
+import jisho
+import verbs
+import writing
+
+
+class RequestError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+_reasons = {
+    200: 'OK', 400: 'Bad Request', 404: 'Not Found',
+    405: 'Method Not Allowed', 413: 'Payload Too Large',
+    500: 'Internal Server Error',
+    }
+_max_body = 2**20
+
+
+def _entry_json(entry):
+    return {
+        'reading': entry.reading,
+        'kanji': entry.kanji,
+        'kanji_alternates': list(entry.kanji_alternates),
+        'parts_of_speech': list(entry.parts_of_speech),
+        'meanings': list(entry.meanings),
+        }
+
+
+def _limit(arguments):
+    limit = arguments.get('limit')
+    if limit is None:
+        return None
+    try:
+        limit = int(limit)
+    except (TypeError, ValueError):
+        raise RequestError(400, 'limit must be a number') from None
+    if limit < 0:
+        raise RequestError(400, 'limit must not be negative')
+    return limit
+
+
+def _argument(arguments, name):
+    value = arguments.get(name)
+    if not value:
+        raise RequestError(400, 'missing argument {}'.format(name))
+    if not isinstance(value, str):
+        raise RequestError(400, '{} must be a string'.format(name))
+    return value
+
+
+class Service:
+    """Answers requests to the endpoints from one dictionary
+
+    >>> service = Service(jisho.Jisho([
+    ...     jisho.Entry('たべる', ('ichidan verb',), ('to eat',), kanji='食べる'),
+    ...     ]))
+    >>> service.handle('/lookup', {'reading': 'たべる'})[0]['meanings']
+    ['to eat']
+    >>> service.handle('/conjugate', {'verb': '食べる'})[0]['forms']['past_informal']
+    '食べた'
+    >>> service.handle('/transliterate', {'text': 'taberu'})
+    'たべる'
+    """
+
+    def __init__(self, dictionary, conjugation_cache=4096):
+        self.dictionary = dictionary
+        self.conjugations = verbs.ConjugationTable(
+            dictionary, conjugation_cache
+            )
+        self._endpoints = {
+            '/lookup': self.lookup,
+            '/prefix': self.prefix,
+            '/conjugate': self.conjugate,
+            '/transliterate': self.transliterate,
+            }
+
+    def handle(self, path, arguments):
+        endpoint = self._endpoints.get(path)
+        if endpoint is None:
+            raise RequestError(404, 'no endpoint {}'.format(path))
+        return endpoint(arguments)
+
+    def lookup(self, arguments):
+        limit = _limit(arguments)
+        dictionary = self.dictionary
+        if 'reading' in arguments:
+            entries = dictionary.top_reading(
+                _argument(arguments, 'reading'), limit
+                )
+        elif 'kanji' in arguments:
+            entries = dictionary.top_kanji(_argument(arguments, 'kanji'), limit)
+        elif 'part_of_speech' in arguments:
+            if limit is None:
+                raise RequestError(400, 'part_of_speech needs a limit')
+            entries = dictionary.top_part_of_speech(
+                _argument(arguments, 'part_of_speech'), limit
+                )
+        elif 'meaning' in arguments:
+            entries = dictionary.lookup_meaning(
+                _argument(arguments, 'meaning'), limit
+                )
+        else:
+            raise RequestError(
+                400, 'lookup needs reading, kanji, part_of_speech or meaning'
+                )
+        return [_entry_json(e) for e in entries]
+
+    def prefix(self, arguments):
+        entries = self.dictionary.lookup_prefix(
+            _argument(arguments, 'text'), _limit(arguments)
+            )
+        return [_entry_json(e) for e in entries]
+
+    def conjugate(self, arguments):
+        verb = _argument(arguments, 'verb')
+        entries = (self.dictionary.lookup_kanji(verb)
+                   | self.dictionary.lookup_reading(verb))
+        ids = map(self.dictionary._entries.__getitem__, entries)
+        results = []
+        for entry in self.dictionary._ranked(ids, _limit(arguments)):
+            try:
+                forms = self.conjugations[entry]
+            except KeyError:
+                continue
+            results.append(dict(_entry_json(entry), forms=forms))
+        return results
+
+    def transliterate(self, arguments):
+        text = _argument(arguments, 'text')
+        to = arguments.get('to', 'hiragana')
+        if to == 'hiragana':
+            return writing.romanji_to_hiragana(text)
+        if to == 'romanji':
+            return writing.hiragana_to_romanji(text)
+        raise RequestError(400, 'to must be hiragana or romanji')
+
+    def batch(self, requests):
+        if not isinstance(requests, list):
+            raise RequestError(400, 'batch takes a list of requests')
+        results = []
+        for request in requests:
+            try:
+                path, arguments = request
+                results.append(self.handle(path, dict(arguments)))
+            except RequestError as e:
+                results.append({'error': str(e)})
+            except (TypeError, ValueError):
+                results.append({'error': 'requests are [path, arguments]'})
+        return results
+
+
+def _response(status, value, keep_alive):
+    body = json.dumps(value, ensure_ascii=False).encode('utf-8')
+    head = (
+        'HTTP/1.1 {} {}\r\n'
+        'Content-Type: application/json; charset=utf-8\r\n'
+        'Content-Length: {}\r\n'
+        '{}'
+        '\r\n'
+        ).format(status, _reasons[status], len(body),
+                 '' if keep_alive else 'Connection: close\r\n')
+    return head.encode('latin-1') + body
+
+
+def _respond(service, method, target, body):
+    url = urllib.parse.urlsplit(target)
+    arguments = dict(urllib.parse.parse_qsl(url.query))
+    if url.path == '/batch':
+        if method != 'POST':
+            raise RequestError(405, 'batch takes a POST')
+        try:
+            requests = json.loads(body)
+        except ValueError:
+            raise RequestError(400, 'batch takes a JSON body') from None
+        return service.batch(requests)
+    if method != 'GET':
+        raise RequestError(405, '{} takes a GET'.format(url.path))
+    return service.handle(url.path, arguments)
+
+
+async def _read_request(reader):
+    """Method, target, headers and body of a request, or None at the end"""
+    try:
+        head = await reader.readuntil(b'\r\n\r\n')
+    except asyncio.IncompleteReadError:
+        return None
+    lines = head.decode('latin-1').split('\r\n')
+    try:
+        method, target, version = lines[0].split()
+    except ValueError:
+        raise RequestError(400, 'bad request line') from None
+    headers = {}
+    for line in lines[1:]:
+        name, _, value = line.partition(':')
+        headers[name.strip().lower()] = value.strip()
+    size = int(headers.get('content-length') or 0)
+    if size > _max_body:
+        raise RequestError(413, 'request body is too large')
+    try:
+        body = await reader.readexactly(size) if size else b''
+    except asyncio.IncompleteReadError:
+        # The client closed before sending the whole body
+        return None
+    keep_alive = headers.get('connection', '').lower() != 'close'
+    if version == 'HTTP/1.0':
+        keep_alive = headers.get('connection', '').lower() == 'keep-alive'
+    return method, target, body, keep_alive
+
+
+async def _serve_connection(service, reader, writer):
+    try:
+        while True:
+            try:
+                request = await _read_request(reader)
+            except (RequestError, ValueError, asyncio.LimitOverrunError) as e:
+                status = getattr(e, 'status', 400)
+                writer.write(_response(status, {'error': str(e)}, False))
+                break
+            if request is None:
+                break
+            method, target, body, keep_alive = request
+            try:
+                response = _response(
+                    200, _respond(service, method, target, body), keep_alive
+                    )
+            except RequestError as e:
+                response = _response(e.status, {'error': str(e)}, keep_alive)
+            except Exception:
+                # Answer rather than drop the connection, and carry on
+                traceback.print_exc()
+                response = _response(500, {'error': 'internal error'},
+                                     keep_alive)
+            writer.write(response)
+            await writer.drain()
+            if not keep_alive:
+                break
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+
+async def serve(service, host='127.0.0.1', port=8080):
+    """Answer requests to a Service until cancelled"""
+    server = await asyncio.start_server(
+        lambda r, w: _serve_connection(service, r, w), host, port,
+        backlog=4096
+        )
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('dict_file', nargs='?', default=jisho._dict_file)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--snapshot', action='store_true',
+                        help='load the dictionary from its snapshot')
+    args = parser.parse_args()
+    dictionary = jisho.create_dictionary(args.dict_file, args.snapshot)
+    print('Serving {} entries on {}:{}'.format(
+        len(dictionary), args.host, args.port
+        ))
+    try:
+        asyncio.run(serve(Service(dictionary), args.host, args.port))
+    except KeyboardInterrupt:
+        pass
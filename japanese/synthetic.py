@@ -0,0 +1,188 @@
+"""Generate made-up dictionaries in the JMdict format
+
+The entries are random, but the same for the same size and seed, and use
+the parts of speech, priority tags and character references of the real
+JMdict file, so benchmarks and experiments can run without downloading it.
+
+Run to write a dictionary:
+    python synthetic.py PATH [--entries N] [--seed N]
+"""
+import random
+
+import writing
+
+
+_header = '''<?xml version="1.0" encoding="UTF-8"?>
+<!DOCTYPE JMdict [
+<!ELEMENT JMdict (entry*)>
+<!ELEMENT entry (ent_seq, k_ele*, r_ele+, sense+)>
+<!ATTLIST gloss xml:lang CDATA "eng">
+{entities}
+]>
+<JMdict>
+'''
+
+_entities = {
+    'n': 'noun (common) (futsuumeishi)',
+    'adv': 'adverb (fukushi)',
+    'adj-i': 'adjective (keiyoushi)',
+    'exp': 'expressions (phrases, clauses, etc.)',
+    'v1': 'Ichidan verb',
+    'v5u': "Godan verb with `u' ending",
+    'v5k': "Godan verb with `ku' ending",
+    'v5g': "Godan verb with `gu' ending",
+    'v5s': "Godan verb with `su' ending",
+    'v5t': "Godan verb with `tsu' ending",
+    'v5m': "Godan verb with `mu' ending",
+    'v5b': "Godan verb with `bu' ending",
+    'v5r': "Godan verb with `ru' ending",
+    'vk': 'Kuru verb - special class',
+    'vs-i': 'suru verb - included',
+    'vt': 'transitive verb',
+    'vi': 'intransitive verb',
+    }
+
+# Parts of speech, the endings their readings and kanji take, and weights
+# roughly as common as in JMdict
+_kinds = (
+    ('n', '', '', 50),
+    ('adv', '', '', 5),
+    ('adj-i', 'い', 'い', 5),
+    ('exp', '', '', 5),
+    ('v1', 'る', 'る', 6),
+    ('v5u', 'う', 'う', 3),
+    ('v5k', 'く', 'く', 3),
+    ('v5g', 'ぐ', 'ぐ', 1),
+    ('v5s', 'す', 'す', 2),
+    ('v5t', 'つ', 'つ', 1),
+    ('v5m', 'む', 'む', 2),
+    ('v5b', 'ぶ', 'ぶ', 1),
+    ('v5r', 'る', 'る', 5),
+    ('vk', 'くる', '来る', 1),
+    ('vs-i', 'する', 'する', 10),
+    )
+_syllables = (
+    'あいうえおかきくけこがぎぐげごさしすせそざじずぜぞたちつてとだでど'
+    'なにぬねのはひふへほばびぶべぼぱぴぷぺぽまみむめもやゆよらりるれろわん'
+    )
+_digraphs = ('きゃ', 'きょ', 'しゃ', 'しゅ', 'しょ', 'ちゃ', 'ちょ', 'じゅ',
+             'じょ', 'りょ', 'ひゃ', 'みょ')
+_kanji = (
+    '日本語食飲行見話書読聞買売待持取知分時間人大小中上下前後年月火水木金'
+    '土山川田学生先会社手目口耳足心気天雨電車道店国家族友名夜朝昼新古長'
+    )
+_words = (
+    'eat drink go come see speak write read hear buy sell wait hold take '
+    'know time person big small middle up down before after year month '
+    'fire water tree gold earth mountain river field study life company '
+    'hand eye mouth ear foot heart spirit sky rain electric car road shop '
+    'country house family friend name night morning noon new old long'
+    ).split()
+
+
+def _reading(rnd, ending):
+    syllables = []
+    for _ in range(rnd.randint(1, 4)):
+        if rnd.random() < 0.1:
+            syllables.append(rnd.choice(_digraphs))
+        else:
+            syllables.append(rnd.choice(_syllables))
+        if rnd.random() < 0.05:
+            syllables.append('っ')
+    reading = ''.join(syllables).lstrip('っ')
+    if reading.endswith('っ') and not ending:
+        reading = reading[:-1]
+    return reading + ending
+
+
+def _loanword(rnd):
+    kana = writing._to_katakana(_reading(rnd, ''))
+    if rnd.random() < 0.5:
+        kana += 'ー'
+    return kana
+
+
+def _kanji_spelling(rnd, ending):
+    return ''.join(
+        rnd.choice(_kanji) for _ in range(rnd.randint(1, 2))
+        ) + ending
+
+
+def _entry(rnd, sequence):
+    entity, reading_end, kanji_end, _ = rnd.choices(
+        _kinds, weights=[k[3] for k in _kinds]
+        )[0]
+    is_loanword = entity == 'n' and rnd.random() < 0.2
+    reading = _loanword(rnd) if is_loanword else _reading(rnd, reading_end)
+    out = ['<entry>\n<ent_seq>{}</ent_seq>\n'.format(sequence)]
+    if not is_loanword and rnd.random() < 0.7:
+        for _ in range(rnd.choices((1, 2, 3), weights=(6, 3, 1))[0]):
+            out.append('<k_ele>\n<keb>{}</keb>\n'.format(
+                _kanji_spelling(rnd, kanji_end)
+                ))
+            if rnd.random() < 0.3:
+                out.append(
+                    '<ke_pri>news{}</ke_pri>\n<ke_pri>nf{:02}</ke_pri>\n'
+                    .format(rnd.randint(1, 2), rnd.randint(1, 48))
+                    )
+            out.append('</k_ele>\n')
+    out.append('<r_ele>\n<reb>{}</reb>\n'.format(reading))
+    if rnd.random() < 0.2:
+        out.append('<re_pri>ichi{}</re_pri>\n'.format(rnd.randint(1, 2)))
+    if is_loanword and rnd.random() < 0.5:
+        out.append('<re_pri>gai1</re_pri>\n')
+    out.append('</r_ele>\n')
+    is_verb = entity.startswith('v')
+    for _ in range(rnd.choices((1, 2, 3), weights=(6, 3, 1))[0]):
+        out.append('<sense>\n<pos>&{};</pos>\n'.format(entity))
+        if is_verb and entity != 'vk':
+            out.append('<pos>&{};</pos>\n'.format(rnd.choice(('vt', 'vi'))))
+        for _ in range(rnd.randint(1, 3)):
+            gloss = ' '.join(
+                rnd.choice(_words) for _ in range(rnd.randint(1, 3))
+                )
+            if is_verb:
+                gloss = 'to ' + gloss
+            if rnd.random() < 0.05:
+                gloss += ' &#38;#8230;'
+            out.append('<gloss>{}</gloss>\n'.format(gloss))
+        out.append('</sense>\n')
+    out.append('</entry>\n')
+    return ''.join(out)
+
+
+def synthetic_jmdict(entries=50000, seed=0):
+    """The text of a made-up JMdict file with a number of entries"""
+    rnd = random.Random(seed)
+    entities = '\n'.join(
+        '<!ENTITY {} "{}">'.format(name, text)
+        for name, text in _entities.items()
+        )
+    out = [_header.format(entities=entities)]
+    out.extend(_entry(rnd, 1000000 + i) for i in range(entries))
+    out.append('</JMdict>\n')
+    return ''.join(out)
+
+
+def write_synthetic(path, entries=50000, seed=0):
+    """Write a made-up JMdict file, which create_dictionary can load
+
+    >>> import os, tempfile, jisho
+    >>> with tempfile.TemporaryDirectory() as directory:
+    ...     path = os.path.join(directory, 'JMdict_e.xml')
+    ...     write_synthetic(path, entries=100)
+    ...     len(jisho.create_dictionary(path)) > 90
+    True
+    """
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(synthetic_jmdict(entries, seed))
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('path')
+    parser.add_argument('--entries', type=int, default=50000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    write_synthetic(args.path, args.entries, args.seed)
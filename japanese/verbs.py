@@ -1,3 +1,7 @@
+import collections
+import dataclasses
+import multiprocessing
+import os
 import unicodedata
 import jisho
 
@@ -27,7 +31,10 @@ class Verb(jisho.Entry):
 
     @classmethod
     def from_entry(cls, entry):
-        values = vars(entry)
+        # Slotted entries have no __dict__ for vars() to read
+        values = {
+            f.name: getattr(entry, f.name) for f in dataclasses.fields(entry)
+            }
         return cls(**values)
 
     def conjugate(self, vowel):
@@ -181,10 +188,12 @@ def past_informal(verb):
     '聞いた'
     >>> past_informal(Verb('およぐ', ['godan verb'], [], kanji='泳ぐ'))
     '泳いだ'
+    >>> past_informal(Verb('あいする', ['suru verb'], [], kanji='愛する'))
+    '愛した'
     """
     written = str(verb)
     if verb.type == 'suru':
-        return 'した'
+        return written[:-2] + 'した'
     elif verb.type == 'kuru':
         if written[-2:] == '来る':
             return written[:-2] + '来た'
@@ -298,9 +307,8 @@ def potential_informal(verb):
     'そんできる'
     """
     written = str(verb)
-    has_kanji = any(unicodedata.name(char)[:3] == 'CJK' for char in written)
     if verb.type == 'suru':
-        if has_kanji:
+        if _has_kanji(written):
             return written[:-2] + '出来る'
         else:
             return written[:-2] + 'できる'
@@ -315,6 +323,285 @@ def potential_informal(verb):
         return verb.conjugate('え') + 'る'
 
 
+def _has_kanji(text):
+    return any(unicodedata.name(char, '')[:3] == 'CJK' for char in text)
+
+
+FORMS = (
+    negative_informal, negative_formal, past_informal, past_negative_informal,
+    volitional_informal, volitional_formal, potential_informal
+    )
+
+
+def _conjugation_group(verb):
+    """Everything about a verb that the conjugation functions branch on
+
+    Each function keeps all but the last one or two characters of a verb and
+    adds an ending, so verbs in the same group conjugate the same way.
+    """
+    written = str(verb)
+    return (
+        verb.type, verb.reading[-1], written[-1], verb.reading[-2:] == 'ある',
+        written[-2:] in {'来る', '行く'}, verb.reading == 'いく' and written,
+        verb.type == 'suru' and _has_kanji(written)
+        )
+
+
+def _conjugation_rule(form, verb):
+    """How many characters form removes from a verb and what it adds"""
+    try:
+        conjugated = form(verb)
+    except KeyError:
+        return None
+    if conjugated is None:
+        return None
+    written = str(verb)
+    kept = len(os.path.commonprefix((written, conjugated)))
+    return len(written) - kept, conjugated[kept:]
+
+
+def _conjugate_chunk(verbs, forms, rules=None):
+    if rules is None:
+        rules = {}
+    conjugations = {}
+    for entry, verb in verbs:
+        group = _conjugation_group(verb)
+        group_rules = rules.get(group)
+        if group_rules is None:
+            group_rules = [
+                (form.__name__, _conjugation_rule(form, verb))
+                for form in forms
+                ]
+            rules[group] = group_rules
+        written = str(verb)
+        size = len(written)
+        conjugations[entry] = {
+            name: rule and written[:size - rule[0]] + rule[1]
+            for name, rule in group_rules
+            }
+    return conjugations
+
+
+def conjugate_many(entries, forms=FORMS, workers=1, chunk_size=5000):
+    """Conjugate every verb among some entries, such as a whole Jisho
+
+    Returns a dict from each entry that is a verb to a dict from the name
+    of each form to the conjugated verb, or None if it can't be conjugated.
+    Each form is only worked out once for each group of verbs that
+    conjugate alike, and the rest of the group reuses it. With more than
+    one worker, or None for one per CPU, chunks of verbs are conjugated by
+    a pool of processes.
+
+    >>> conjugations = conjugate_many([
+    ...     Verb('たべる', ['ichidan verb'], [], kanji='食べる'),
+    ...     Verb('みる', ['ichidan verb'], [], kanji='見る'),
+    ...     jisho.Entry('ほん', ['noun'], [], kanji='本'),
+    ...     ], forms=(negative_informal, volitional_formal))
+    >>> for verb, forms in conjugations.items():
+    ...     print(verb, forms)
+    食べる {'negative_informal': '食べない', 'volitional_formal': '食べましょう'}
+    見る {'negative_informal': '見ない', 'volitional_formal': '見ましょう'}
+    """
+    verbs = []
+    for entry in entries:
+        verb = entry if isinstance(entry, Verb) else Verb.from_entry(entry)
+        if verb.type is not None:
+            verbs.append((entry, verb))
+    if workers == 1:
+        return _conjugate_chunk(verbs, forms)
+    chunks = [
+        (verbs[i:i + chunk_size], forms)
+        for i in range(0, len(verbs), chunk_size)
+        ]
+    conjugations = {}
+    with multiprocessing.Pool(workers) as pool:
+        for chunk in pool.starmap(_conjugate_chunk, chunks):
+            conjugations.update(chunk)
+    return conjugations
+
+
+class ConjugationTable:
+    """Every form of the verbs in a Jisho, conjugated on first use
+
+    Looking an entry up gives a dict from the name of each form to the
+    conjugated verb, or None, as conjugate_many does, and raises KeyError
+    if the entry isn't a verb. Up to maxsize entries are kept, dropping the
+    least recently used, or all of them if maxsize is None. materialize
+    conjugates every verb in the dictionary into its precomputed values,
+    which are saved with its snapshot and looked up before the cache.
+    hits and misses count the lookups that did and didn't need conjugating.
+
+    >>> words = jisho.Jisho([
+    ...     jisho.Entry('たべる', ('ichidan verb',), ('to eat',), kanji='食べる'),
+    ...     jisho.Entry('ほん', ('noun',), ('book',), kanji='本'),
+    ...     ])
+    >>> table = ConjugationTable(words, maxsize=16)
+    >>> eat, = words.lookup_reading('たべる')
+    >>> table[eat]['past_informal']
+    '食べた'
+    >>> table[eat]['negative_formal']
+    '食べません'
+    >>> table.hits, table.misses
+    (1, 1)
+    >>> table.materialize()
+    >>> len(words.precomputed['conjugations'])
+    1
+    """
+
+    def __init__(self, dictionary=None, maxsize=1024):
+        self.dictionary = dictionary
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._cache = collections.OrderedDict()
+        self._rules = {}
+
+    def _materialized(self):
+        if self.dictionary is None:
+            return {}
+        return self.dictionary.precomputed.get('conjugations', {})
+
+    def __getitem__(self, entry):
+        forms = self._materialized().get(entry)
+        if forms is None:
+            forms = self._cache.get(entry)
+            if forms is None:
+                self.misses += 1
+                return self._conjugate(entry)
+            self._cache.move_to_end(entry)
+        self.hits += 1
+        return forms
+
+    def _conjugate(self, entry):
+        verb = entry if isinstance(entry, Verb) else Verb.from_entry(entry)
+        if verb.type is None:
+            raise KeyError(entry)
+        forms = _conjugate_chunk([(entry, verb)], FORMS, self._rules)[entry]
+        self._cache[entry] = forms
+        if self.maxsize is not None and len(self._cache) > self.maxsize:
+            self._cache.popitem(last=False)
+        return forms
+
+    def materialize(self, workers=1):
+        """Conjugate every verb in the dictionary ahead of time"""
+        self.dictionary.precomputed['conjugations'] = conjugate_many(
+            self.dictionary, workers=workers
+            )
+        self._cache.clear()
+
+    def clear(self):
+        """Empty the cache and reset the counters"""
+        self._cache.clear()
+        self.hits = 0
+        self.misses = 0
+
+
+def _build_deconjugation_rules():
+    """Map the endings each form adds back to the endings it replaced
+
+    The rules come from conjugating template verbs, whose placeholder first
+    character ゐ or 一 marks where the unchanged part of a verb stops.
+    """
+    templates = [
+        Verb('ゐ' + ending, ['godan verb'], [])
+        for ending in sorted({e for e, _ in Verb._u_conjugated})
+        ]
+    templates += [
+        Verb('ゐある', ['godan verb'], []),
+        Verb('ゐいく', ['godan verb'], [], kanji='ゐ行く'),
+        Verb('いく', ['godan verb'], []),
+        Verb('ゐる', ['ichidan verb'], []),
+        Verb('ゐくる', ['kuru verb'], []),
+        Verb('ゐくる', ['kuru verb'], [], kanji='ゐ来る'),
+        Verb('ゐする', ['suru verb'], []),
+        Verb('ゐする', ['suru verb'], [], kanji='一する'),
+        ]
+    rules = {}
+    for verb in templates:
+        written = str(verb)
+        kept = 1 if written[0] in {'ゐ', '一'} else 0
+        for form in FORMS:
+            try:
+                conjugated = form(verb)
+            except KeyError:
+                continue
+            if conjugated is not None:
+                rules.setdefault(conjugated[kept:], set()).add(
+                    (written[kept:], form)
+                    )
+    return rules
+
+
+_deconjugation_rules = _build_deconjugation_rules()
+_longest_conjugated_ending = max(len(e) for e in _deconjugation_rules)
+
+
+def deconjugate(text):
+    """Possible dictionary forms of a conjugated verb
+
+    Returns (dictionary form, form function) pairs for every rule whose
+    ending text has, without checking that the verbs exist.
+
+    >>> for base, form in deconjugate('話せる'):
+    ...     print(base, form.__name__)
+    話す potential_informal
+    >>> sorted(base for base, form in deconjugate('食べなかった'))
+    ['食べある', '食べなかう', '食べなかっる', '食べなかつ', '食べなかる', '食べる']
+    >>> [(base, form.__name__) for base, form in deconjugate('来ない')]
+    [('来る', 'negative_informal'), ('来ある', 'negative_informal')]
+    """
+    candidates = []
+    for size in range(min(len(text), _longest_conjugated_ending), 0, -1):
+        for ending, form in sorted(
+                _deconjugation_rules.get(text[-size:], ()),
+                key=lambda rule: (rule[0], rule[1].__name__)
+                ):
+            candidates.append((text[:-size] + ending, form))
+    # Rules for different verb types can give the same pair, as with 来る
+    return list(dict.fromkeys(candidates))
+
+
+def lookup_conjugated(dictionary, text):
+    """Verbs in a Jisho that conjugate into text
+
+    Each candidate from deconjugate is looked up by reading and kanji, and
+    kept if conjugating it, in writing or in kana alone, gives text back.
+    Returns (entry, form function) pairs.
+
+    >>> words = jisho.Jisho([
+    ...     jisho.Entry('たべる', ('ichidan verb',), ('to eat',), kanji='食べる'),
+    ...     jisho.Entry('はなす', ("godan verb with 'su' ending",), ('to speak',),
+    ...                 kanji='話す'),
+    ...     jisho.Entry('くる', ('kuru verb',), ('to come',), kanji='来る'),
+    ...     ])
+    >>> for entry, form in lookup_conjugated(words, '食べなかった'):
+    ...     print(entry, form.__name__)
+    食べる past_negative_informal
+    >>> for entry, form in lookup_conjugated(words, 'はなせる'):
+    ...     print(entry, form.__name__)
+    話す potential_informal
+    >>> for entry, form in lookup_conjugated(words, '来なかった'):
+    ...     print(entry, form.__name__)
+    来る past_negative_informal
+    """
+    matches = []
+    for base, form in deconjugate(text):
+        entries = dictionary.lookup_reading(base) | dictionary.lookup_kanji(base)
+        for entry in entries:
+            verb = Verb.from_entry(entry)
+            if verb.type is None:
+                continue
+            kana = Verb.from_entry(dataclasses.replace(entry, kanji=''))
+            for candidate in (verb, kana):
+                try:
+                    if form(candidate) == text:
+                        matches.append((entry, form))
+                        break
+                except KeyError:
+                    pass
+    return matches
+
+
 if __name__ == '__main__':
     import doctest
     doctest.testmod()
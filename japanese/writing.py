@@ -1,5 +1,6 @@
 """Convert between the syllabic writing systems"""
-import string
+import itertools
+import re
 
 
 _rmj_to_hrgn = {
@@ -36,54 +37,245 @@ _rmj_to_hrgn = {
 _hrgn_to_rmj = {h: r for r, h in _rmj_to_hrgn.items()}
 
 
+def _romanji_syllable_table():
+    table = dict(_rmj_to_hrgn)
+    table["n'"] = 'ん'
+    for romanji, kana in _rmj_to_hrgn.items():
+        # A doubled consonant is written with a small tsu
+        if romanji[0] not in {'a', 'e', 'i', 'o', 'u', 'n'}:
+            table[romanji[0] + romanji] = 'っ' + kana
+        if romanji.startswith('ch'):
+            table['t' + romanji] = 'っ' + kana
+    return table
+
+
+_romanji_syllables = _romanji_syllable_table()
+# An optional doubled consonant, a consonant, an optional y and a vowel make
+# up a syllable. Any other letter, such as an n not starting a syllable, is
+# matched on its own, and runs of other characters are kept whole.
+_romanji_syllable_pattern = re.compile(
+    r"[bcdfghjkmprstvwxz]?(?:sh|ch|ts|dz|zh|[bcdfghjkmnprstvwyz])?y?[aeiou]"
+    r"|n'|[^a-z]+|.",
+    re.IGNORECASE | re.DOTALL
+    )
+
+
+def _romanji_syllables_to_hiragana(text):
+    syllables = _romanji_syllable_pattern.findall(text)
+    return ''.join(map(
+        _romanji_syllables.get, map(str.lower, syllables), syllables
+        ))
+
+
+class _RunTable(dict):
+    """Kana for lowercase runs of consonants ending in a vowel or an '
+
+    Runs missing from the table are converted syllable by syllable.
+    """
+
+    def __missing__(self, run):
+        return _romanji_syllables_to_hiragana(run)
+
+
+def _romanji_run_table():
+    table = _RunTable(_romanji_syllables)
+    # An n ends a syllable before a consonant, as in shinbun
+    for romanji in _rmj_to_hrgn:
+        table.setdefault('n' + romanji, _romanji_syllables_to_hiragana(
+            'n' + romanji
+            ))
+    # Spaces and punctuation come between most words, and are kept as
+    # they are without a call to __missing__
+    for char in map(chr, range(128)):
+        if not char.isalpha() and char != "'":
+            table[char] = char
+    return table
+
+
+_romanji_runs = _romanji_run_table()
+# Every syllable ends a run, so converting text a run at a time gives the
+# same as converting it a syllable at a time, with simpler matching
+_romanji_run_pattern = re.compile(
+    r"[b-df-hj-np-tv-z]*[aeiou']|[b-df-hj-np-tv-z]+|[^a-z']+"
+    )
+
+
 def romanji_to_hiragana(text):
     """
     >>> romanji_to_hiragana('minna, shigoto ha kyuji ni hajimeru no tottemo ii')
     'みんな, しごと は きゅじ に はじめる の とっても いい'
+    >>> romanji_to_hiragana('shinbun to matcha')
+    'しんぶん と まっちゃ'
+    >>> romanji_to_hiragana("kin'en, Konnichiwa")
+    'きんえん, こんにちわ'
+
+    Syllables missing from the table are left as they are.
+    >>> romanji_to_hiragana('si to ti')
+    'si と ti'
     """
-    vowels = {'a', 'e', 'i', 'o', 'u'}
-    on = ''
-    hiragana = []
-    for char in text:
-        is_letter = char in string.ascii_letters
-        if is_letter:
-            on += char
-        if char in vowels or (on and not is_letter):
-            if len(on) > 1 and on[0] == on[1]:
-                if on[0] != 'n':
-                    hiragana.append('っ')
-                else:
-                    hiragana.append('ん')
-                on = on[1:]
-            hiragana.append(_rmj_to_hrgn[on])
-            on = ''
-        if not is_letter:
-            hiragana.append(char)
-    return ''.join(hiragana)
+    if text != text.lower():
+        return _romanji_syllables_to_hiragana(text)
+    return ''.join(map(
+        _romanji_runs.__getitem__, _romanji_run_pattern.findall(text)
+        ))
+
+
+def _to_katakana(hiragana):
+    # Katakana sit at a fixed offset from the matching hiragana
+    return ''.join(chr(ord(char) + 0x60) for char in hiragana)
+
+
+_small_vowel_digraphs = {
+    'ふぁ': 'fa', 'ふぃ': 'fi', 'ふぇ': 'fe', 'ふぉ': 'fo',
+    'ゔぁ': 'va', 'ゔぃ': 'vi', 'ゔぇ': 've', 'ゔぉ': 'vo',
+    'うぃ': 'wi', 'うぇ': 'we', 'うぉ': 'wo',
+    'てぃ': 'ti', 'でぃ': 'di', 'とぅ': 'tu', 'どぅ': 'du',
+    'しぇ': 'she', 'じぇ': 'je', 'ちぇ': 'che',
+    }
+
+
+def _kana_tables():
+    syllables = {}
+    digraphs = {}
+    for kana, romanji in _hrgn_to_rmj.items():
+        table = syllables if len(kana) == 1 else digraphs
+        table[kana] = table[_to_katakana(kana)] = romanji
+    for small, vowel in zip('ぁぃぅぇぉ', 'aiueo'):
+        syllables[small] = syllables[_to_katakana(small)] = vowel
+    # Small vowels mostly spell sounds borrowed from other languages
+    for kana, romanji in _small_vowel_digraphs.items():
+        digraphs[kana] = digraphs[_to_katakana(kana)] = romanji
+    return syllables, digraphs
+
+
+def _translation_list(mapping):
+    # str.translate indexes a list by code point quicker than it looks up a
+    # dict, and leaves characters past the end of the list as they are
+    table = list(range(max(map(ord, mapping)) + 1))
+    for char, text in mapping.items():
+        table[ord(char)] = text
+    return table
+
+
+_kana_syllables, _kana_digraphs = _kana_tables()
+_kana_translation = _translation_list(_kana_syllables)
+_digraph_firsts = ''.join(sorted({k[0] for k in _kana_digraphs}))
+_digraph_seconds = ''.join(sorted({k[1] for k in _kana_digraphs}))
+_kana_marks = 'っッ' + _digraph_seconds
+# A small ya, yu or yo is translated to its vowel after this mark, for the
+# stems below to join to the kana before it
+_small_y_mark = 'ʼ'
+
+
+def _plain_kana_table():
+    table = {
+        kana: romanji for kana, romanji in _kana_syllables.items()
+        if kana not in _kana_marks
+        }
+    for small, vowel in zip('ゃゅょ', 'auo'):
+        table[small] = table[_to_katakana(small)] = _small_y_mark + vowel
+    return table
+
+
+def _small_y_stem_table():
+    stems = []
+    for kana, romanji in _hrgn_to_rmj.items():
+        # ん and い make the same letters as に, so the stem of にゃ can't
+        # be told apart
+        if len(kana) == 2 and kana[1] == 'ゃ' and kana[0] != 'に':
+            stems.append((_hrgn_to_rmj[kana[0]] + _small_y_mark, romanji[:-1]))
+    # The stems of しゃ and ちゃ go before that of ひゃ, which they end in
+    return sorted(stems, key=lambda stem: -len(stem[0]))
+
+
+# Leaves small kana other than ya, yu and yo as they are, so text still
+# needing the regex below is the text that isn't all ASCII once translated
+# and joined up
+_plain_kana_translation = _translation_list(_plain_kana_table())
+_small_y_stems = _small_y_stem_table()
+
+
+def _kana_unit_table():
+    units = {}
+    # A small ya, yu or yo joins the kana before it even in the other
+    # script, as it does once translated with _plain_kana_translation
+    other_script = str.maketrans('ゃゅょャュョ', 'ャュョゃゅょ')
+    for first, second in itertools.product(_digraph_firsts, _digraph_seconds):
+        pair = first + second
+        units[pair] = (
+            _kana_digraphs.get(pair)
+            or _kana_digraphs.get(pair.translate(other_script))
+            or pair.translate(_kana_translation)
+            )
+    for kana, romanji in [*_kana_syllables.items(), *units.items()]:
+        # A small tsu doubles the consonant after it
+        units['っ' + kana] = units['ッ' + kana] = romanji[0] + romanji
+    # and is dropped with nothing to double, as in あっ
+    units['っ'] = units['ッ'] = ''
+    return units
+
+
+# Romanji for each pair of kana that may be a digraph, and for each small
+# tsu with what comes after it
+_kana_units = _kana_unit_table()
+# Each branch starts with a set of characters, which lets the regex engine
+# skip quickly over the text between matches
+_kana_pattern = re.compile('[っッ]?[{}][{}]|[っッ][{}]?'.format(
+    _digraph_firsts, _digraph_seconds, ''.join(sorted(_kana_syllables))
+    ))
+
+
+def _kana_unit(match):
+    return _kana_units[match[0]]
+
+
+def _long_vowels(romanji):
+    # Each replace is a single pass, as a regex sub would be, and quicker
+    for vowel in 'aeiou':
+        romanji = romanji.replace(vowel + 'ー', vowel * 2)
+    return romanji
 
 
 def hiragana_to_romanji(text):
-    """
+    """Convert hiragana and katakana to romanji
+
     >>> hiragana_to_romanji('みんな, しごと は きゅじ に はじめる の とっても いい')
     'minna, shigoto ha kyuji ni hajimeru no tottemo ii'
+    >>> hiragana_to_romanji('マッチャ と コーヒー')
+    'maccha to koohii'
+    >>> hiragana_to_romanji('パーティー')
+    'paatii'
+    >>> hiragana_to_romanji('あっ')
+    'a'
+    """
+    romanji = text.translate(_plain_kana_translation)
+    if romanji.isascii():
+        # Most readings have no digraph, small tsu or long vowel
+        return romanji
+    if _small_y_mark in romanji and _small_y_mark not in text:
+        for stem, joined in _small_y_stems:
+            romanji = romanji.replace(stem, joined)
+    if 'ー' in romanji:
+        romanji = _long_vowels(romanji)
+    if romanji.isascii():
+        return romanji
+    # Small tsu and small vowels, and anything else the translation missed
+    romanji = _kana_pattern.sub(_kana_unit, text).translate(_kana_translation)
+    if 'ー' in romanji:
+        romanji = _long_vowels(romanji)
+    return romanji
+
+
+def convert_many(texts):
+    """Convert many texts from kana to romanji, such as every reading
+
+    Most readings take a single translation, so converting them one by
+    one is as quick as joining them and converting the whole.
+
+    >>> convert_many(['きょう', 'ニッポン'])
+    ['kyou', 'nippon']
     """
-    out = []
-    previous = ''
-    is_carried = False
-    for char in text:
-        if char in {'ゃ', 'ょ', 'ゅ'}:
-            del out[-1]
-            char = previous + char
-        if char == 'っ':
-            is_carried = True
-        else:
-            rj = _hrgn_to_rmj.get(char, char)
-            if is_carried:
-                rj = rj[0] + rj
-                is_carried = False
-            out.append(rj)
-        previous = char
-    return ''.join(out)
+    return list(map(hiragana_to_romanji, texts))
 
 
 if __name__ == '__main__':